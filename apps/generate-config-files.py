@@ -84,9 +84,11 @@ parser.add_option("-t", "--threshold", dest="t", type="int",
                   help="threshold (it must hold that t < n/2)")
 parser.add_option("--skip-prss", action="store_true",
                   help="do not generate PRSS keys")
+parser.add_option("--prf", type="choice", choices=["1", "2"],
+                  help="version of the PRF used for PRSS")
 
 parser.set_defaults(verbose=True, n=3, t=1, prefix='player', skip_prss=False,
-                    keysize=1024, paillier='viff')
+                    keysize=1024, paillier='viff', prf="2")
 
 (options, args) = parser.parse_args()
 
@@ -100,7 +102,8 @@ if len(args) != options.n:
 
 addresses = [arg.split(':', 1) for arg in args]
 configs = generate_configs(options.n, options.t, paillier, addresses,
-                           options.prefix, options.skip_prss)
+                           options.prefix, options.skip_prss,
+                           int(options.prf))
 
 for config in configs.itervalues():
     config.write()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+# This program measures how many values per second the PRFs used for
+# pseudo-random secret sharing can produce. Each PRF version is
+# measured both when called once per value and when producing many
+# values with a single call to its stream method. Run it like this:
+#
+# % ./prf-benchmark.py --count 10000 --modulus "2**64"
+
+from optparse import OptionParser
+import time
+
+from viff.prss import PRF_VERSIONS
+from viff.util import find_prime
+
+parser = OptionParser()
+parser.add_option("-c", "--count", type="int",
+                  help="number of values to generate")
+parser.add_option("-m", "--modulus",
+                  help="lower bound for the modulus")
+parser.set_defaults(count=10000, modulus="2**64")
+
+(options, args) = parser.parse_args()
+
+modulus = find_prime(options.modulus)
+count = options.count
+
+print "Modulus: %d bits" % len(bin(modulus)[2:])
+print "Values:  %d" % count
+print
+
+for version, PRF in sorted(PRF_VERSIONS.items()):
+    prf = PRF("benchmark key", modulus)
+
+    start = time.time()
+    for i in xrange(count):
+        prf((i, 0))
+    single = count / (time.time() - start)
+
+    start = time.time()
+    prf.stream("input", count)
+    stream = count / (time.time() - start)
+
+    print "Version %d: %10.0f values/sec (single), %10.0f values/sec (stream)" \
+        % (version, single, stream)
@@ -110,8 +110,8 @@ class Protocol:
         array = self.make_array()
         sorted = self.sort(array)
 
-        array = gather_shares(map(runtime.open, array))
-        sorted = gather_shares(map(runtime.open, sorted))
+        array = runtime.open_many(array)
+        sorted = runtime.open_many(sorted)
 
         self.progressbar.start()
 
@@ -154,16 +154,22 @@ class Protocol:
         return predict_bitonic_sort(array_size)
 
     def make_array(self):
-        array = []
-        for i in range(options.size):
-            inputter = (i % 3) + 1
+        # Player k inputs the elements at index k-1, k+2, k+5, ...
+        array = [None] * options.size
+        for inputter in 1, 2, 3:
+            indices = range(inputter - 1, options.size, 3)
+            if not indices:
+                continue
             if inputter == self.rt.id:
-                number = rand.randint(1, options.max)
-                print "Sharing array[%d] = %s" % (i, number)
+                numbers = [rand.randint(1, options.max) for i in indices]
+                for i, number in zip(indices, numbers):
+                    print "Sharing array[%d] = %s" % (i, number)
             else:
-                number = None
-            share = self.rt.shamir_share([inputter], Zp, number)
-            array.append(share)
+                numbers = None
+            shares = self.rt.shamir_share_vector([inputter], Zp, numbers,
+                                                 len(indices))
+            for i, share in zip(indices, shares):
+                array[i] = share
         return array
 
     def sort(self, array):
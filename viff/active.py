@@ -19,11 +19,9 @@
 
 from math import ceil
 
-from gmpy import numdigits
-
 from twisted.internet.defer import gatherResults, Deferred
 
-from viff import shamir
+from viff import shamir, ntt
 from viff.util import rand
 from viff.matrix import Matrix, hyper
 from viff.passive import PassiveRuntime
@@ -287,10 +285,23 @@ class TriplesHyperinvertibleMatricesMixin:
 
     def _share_single(self, si, degree, field):
         inputters = range(1, self.num_players + 1)
+        svec = self.shamir_share(inputters, field, si, degree)
+
+        if self.options.ntt and ntt.hyper_supported(field, self.num_players):
+            # Multiply with the hyper-invertible matrix from viff.ntt
+            # in O(n log n) once all shares have arrived.
+            def split(products, rvec):
+                for share, product in zip(rvec, products):
+                    share.callback(product)
+
+            rvec = [Share(self, field) for _ in svec]
+            products = gather_shares(svec)
+            products.addCallback(ntt.hyper_mul)
+            products.addCallback(split, rvec)
+            return svec, rvec
+
         if self._hyper is None:
             self._hyper = hyper(self.num_players, field)
-
-        svec = self.shamir_share(inputters, field, si, degree)
         rvec = self._hyper * Matrix([svec]).transpose()
         rvec = rvec.transpose().rows[0]
         return svec, rvec
@@ -397,10 +408,6 @@ class TriplesPRSSMixin:
         Returns a tuple with the number of triples generated and a
         Deferred which will yield a singleton-list with a 3-tuple.
         """
-
-        # This adjusted to the PRF based on SHA1 (160 bits).
-        quantity = min(quantity, max(int(160 /numdigits(field.modulus - 1, 2)), 1))
-
         a_t = self.prss_share_random_multi(field, quantity)
         b_t = self.prss_share_random_multi(field, quantity)
         r_t, r_2t = self.prss_double_share(field, quantity)
@@ -432,9 +439,95 @@ class BasicActiveRuntime(PassiveRuntime):
     :class:`ActiveRuntime` instead.
     """
 
+    def __init__(self, player, threshold, options=None):
+        """Initialize runtime."""
+        PassiveRuntime.__init__(self, player, threshold, options)
+        #: Ids of the players that have sent wrong shares in
+        #: :meth:`robust_open`.
+        self.inconsistent_players = set()
+
     def get_triple(self, field):
         raise NotImplementedError
 
+    def robust_open(self, share, receivers=None):
+        """Open a secret sharing in the presence of wrong shares.
+
+        This works like :meth:`open`, except that up to
+        :attr:`threshold` wrong shares are corrected. As soon as
+        2 * :attr:`threshold` + 1 shares have arrived and lie on a
+        polynomial of degree :attr:`threshold`, they are recombined.
+        Otherwise we wait for more shares and decode them with
+        :func:`viff.shamir.decode`. The players found to have sent
+        wrong shares are added to :attr:`inconsistent_players`.
+
+        Communication cost: every player sends one share to each
+        receiving player.
+        """
+        assert isinstance(share, Share)
+        # all players receive result by default
+        if receivers is None:
+            receivers = self.players.keys()
+        t = self.threshold
+
+        def exchange(share):
+            # Send share to all receivers.
+            pc = tuple(self.program_counter)
+            for peer_id in receivers:
+                if peer_id != self.id:
+                    self.protocols[peer_id].sendShare(pc, share)
+            if self.id not in receivers:
+                return
+
+            result = Deferred()
+            received = []
+            senders = {}
+
+            def decode(shares):
+                # Sort the shares by player id so that each set of
+                # players uses the same cached vectors and matrices,
+                # whatever the order of arrival.
+                shares = sorted(shares, key=lambda (x, _): x.value)
+                errors = min(len(shares) - 2*t - 1, t)
+                if errors == 0:
+                    if shamir.verify_sharing(shares, t):
+                        return self._recombine(shares[:t+1]), []
+                    return None
+                return shamir.decode(shares, t, errors)
+
+            def arrived(s, peer_id):
+                if result.called:
+                    return
+                x = s.field.scalar_field(peer_id)
+                senders[x] = peer_id
+                received.append((x, s))
+                if len(received) > 2*t:
+                    decoded = decode(received)
+                    if decoded is not None:
+                        secret, wrong = decoded
+                        self.inconsistent_players.update([senders[w]
+                                                          for w in wrong])
+                        result.callback(secret)
+                        return
+                if len(received) == len(self.players):
+                    result.errback(AssertionError("Could not decode shares"))
+
+            for peer_id in self.players:
+                if peer_id == self.id:
+                    arrived(share, peer_id)
+                else:
+                    d = self._expect_share(peer_id, share.field)
+                    d.addCallback(arrived, peer_id)
+            return result
+
+        result = share.clone()
+        self.schedule_callback(result, exchange)
+
+        # do actual communication
+        self.activate_reactor()
+
+        if self.id in receivers:
+            return result
+
     def mul(self, share_x, share_y):
         """Multiplication of shares.
 
@@ -29,9 +29,15 @@ relatively fast."""
 import time
 import operator
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from viff.field import GF256
 from viff.runtime import Share, gather_shares
 from viff.matrix import Matrix
+from viff.vector import GF256Vector, gf256_mat_mul
 
 
 def bit_decompose(share, use_lin_comb=True):
@@ -264,7 +270,9 @@ class AES:
     def shift_row(self, state):
         """Rijndael ShiftRow.
 
-        State should be a list of 4 rows."""
+        State should be a list of 4 rows or a local
+        :class:`~viff.vector.GF256Vector` with 4 rows. Such a vector
+        can have a third axis holding a batch of states."""
 
         assert len(state) == 4, "Wrong state size."
 
@@ -273,6 +281,11 @@ class AES:
         else:
             offsets = [0, 1, 3, 4]
 
+        if isinstance(state, GF256Vector):
+            for i, row in enumerate(state.values):
+                row[:] = numpy.roll(row, -offsets[i], axis=0)
+            return
+
         for i, row in enumerate(state):
             for j in range(offsets[i]):
                 row.append(row.pop(0))
@@ -288,11 +301,14 @@ class AES:
     def mix_column(self, state, use_lin_comb=True):
         """Rijndael MixColumn.
 
-        Input should be a list of 4 rows."""
+        Input should be a list of 4 rows or a local
+        :class:`~viff.vector.GF256Vector` as for :meth:`shift_row`."""
 
         assert len(state) == 4, "Wrong state size."
 
-        if use_lin_comb:
+        if isinstance(state, GF256Vector):
+            state.values[:] = gf256_mat_mul(AES.C.rows, state).values
+        elif use_lin_comb:
             columns = zip(*state)
 
             for i, row in enumerate(state):
@@ -305,11 +321,19 @@ class AES:
         """Rijndael AddRoundKey.
 
         State should be a list of 4 rows and round_key a list of
-        4-byte columns (words)."""
+        4-byte columns (words). The state can also be a local
+        :class:`~viff.vector.GF256Vector` as for :meth:`shift_row`,
+        the key is then added to every state in the batch."""
 
         assert len(round_key) == self.n_b, "Wrong key size."
         assert len(round_key[0]) == 4, "Key must consist of 4-byte words."
 
+        if isinstance(state, GF256Vector):
+            key = GF256Vector(round_key).values.T
+            key = key.reshape(key.shape + (1,) * (state.values.ndim - 2))
+            state.values ^= key
+            return
+
         state[:] = (Matrix(state) + Matrix(zip(*round_key))).rows
 
     def key_expansion(self, key, new_length=None):
@@ -197,7 +197,7 @@ class ComparisonToft07Mixin:
 
         # TODO: do not generate all bits, only $l$ of them
         # could perhaps do PRSS over smaller subset?
-        r_bitsField = [self.prss_share_random(field, True) for _ in range(l+k)]
+        r_bitsField = self.prss_share_random_bits(field, l+k)
 
         # TODO: compute r_full from r_modl and top bits, not from scratch
         r_full = 0
@@ -29,8 +29,11 @@ function to generate a player config and save it in a number of
 :func:`load_config` function.
 """
 
+import warnings
+from hashlib import sha256
+
 from viff.libs.configobj import ConfigObj
-from viff.prss import generate_subsets, PRF
+from viff.prss import iter_subsets, PRF_VERSIONS, PRFMap
 from viff.util import rand
 from viff.paillierutil import ViffPaillier
 from viff import paillierutil
@@ -39,7 +42,8 @@ from viff import paillierutil
 class Player:
     """Wrapper for information about a player in the protocol."""
 
-    def __init__(self, id, host, port, pubkey, seckey=None, keys=None, dealer_keys=None):
+    def __init__(self, id, host, port, pubkey, seckey=None, keys=None,
+                 dealer_keys=None, prf_version=1):
         """Initialize a player."""
         self.id = id
         self.host = host
@@ -48,6 +52,10 @@ class Player:
         self.seckey = seckey
         self.keys = keys
         self.dealer_keys = dealer_keys
+        #: Version of the PRF used for PRSS, see
+        #: :data:`viff.prss.PRF_VERSIONS`. All players must use the
+        #: same version.
+        self.prf_version = prf_version
         self.prfs_cache = {}
         self.dealers_cache = {}
 
@@ -58,13 +66,14 @@ class Player:
         of a pseudo-random secret sharing for sharing an element
         random to all players.
 
-        Return a mapping from player subsets to :class:`viff.prss.PRF`
-        instances.
+        Return a :class:`viff.prss.PRFMap` from player subsets to
+        :class:`viff.prss.PRF` instances.
         """
         try:
             return self.prfs_cache[modulus]
         except KeyError:
-            self.prfs_cache[modulus] = prfs = {}
+            PRF = PRF_VERSIONS[self.prf_version]
+            self.prfs_cache[modulus] = prfs = PRFMap()
             for subset, key in self.keys.iteritems():
                 prfs[subset] = PRF(key, modulus)
             return prfs
@@ -75,15 +84,16 @@ class Player:
         The pseudo-random functions are used when this player is the
         dealer in a pseudo-random secret sharing.
 
-        Return a mapping from player subsets to :class:`viff.prss.PRF`
+        Return a mapping from dealers to :class:`viff.prss.PRFMap`
         instances.
         """
         try:
             return self.dealers_cache[modulus]
         except KeyError:
+            PRF = PRF_VERSIONS[self.prf_version]
             self.dealers_cache[modulus] = dealers = {}
             for dealer, keys in self.dealer_keys.iteritems():
-                prfs = {}
+                prfs = PRFMap()
                 for subset, key in keys.iteritems():
                     prfs[subset] = PRF(key, modulus)
                 dealers[dealer] = prfs
@@ -94,6 +104,44 @@ class Player:
         return "<Player %d: %s:%d>" % (self.id, self.host, self.port)
 
 
+def derive_prss_keys(seed, n, t, id):
+    """Derive the PRSS keys of player *id* from *seed*.
+
+    The keys are for *n* players with threshold *t*. Every key is a
+    hash of the seed and the subset (and dealer) it belongs to. The
+    result is a pair with the keys and the dealer keys in the format
+    used by :class:`Player`:
+
+    >>> keys, dealer_keys = derive_prss_keys("seed", 3, 1, 1)
+    >>> sorted(map(sorted, keys))
+    [[1, 2], [1, 3]]
+    >>> sorted(map(sorted, dealer_keys[1]))
+    [[1, 2], [1, 3], [2, 3]]
+    >>> sorted(map(sorted, dealer_keys[2]))
+    [[1, 2], [1, 3]]
+
+    .. warning::
+
+       Every player knowing the seed can compute all keys, so this
+       is only secure if no player is corrupted. It is meant for
+       testing and benchmarking with many players.
+    """
+    def derive_key(*parts):
+        return sha256(" ".join(map(str, (seed,) + parts))).hexdigest()
+
+    players = range(1, n+1)
+    keys = {}
+    dealer_keys = dict([(dealer, {}) for dealer in players])
+    for subset in iter_subsets(players, n-t):
+        s = " ".join(map(str, sorted(subset)))
+        if id in subset:
+            keys[subset] = derive_key(s)
+        for dealer in players:
+            if id == dealer or id in subset:
+                dealer_keys[dealer][subset] = derive_key("dealer", dealer, s)
+    return keys, dealer_keys
+
+
 def load_config(source):
     """Load a player configuration file.
 
@@ -125,6 +173,8 @@ def load_config(source):
     else:
         config = ConfigObj(source, file_error=True)
     players = {}
+    # The number of players is needed to derive PRSS keys.
+    num_players = max([p_unstr(player) for player in config])
 
     for player in config:
         id = p_unstr(player)
@@ -160,7 +210,21 @@ def load_config(source):
                 for subset in config[player]['prss_dealer_keys'][dealer]:
                     dealer_keys[d][s_unstr(subset)] = config[player]['prss_dealer_keys'][dealer][subset]
 
-            players[id] = Player(id, host, port, pubkey, seckey, keys, dealer_keys)
+            if 'prss_kdf' in config[player]:
+                warnings.warn("INSECURE: the PRSS keys of player %d are "
+                              "derived from a seed known by all players. "
+                              "This must only be used for testing." % id,
+                              RuntimeWarning)
+                kdf = config[player]['prss_kdf']
+                keys, dealer_keys = derive_prss_keys(kdf['seed'], num_players,
+                                                     int(kdf['threshold']), id)
+
+            # Configurations without a PRF version are from before
+            # version 2 was introduced.
+            prf_version = int(config[player].get('prss_prf', 1))
+
+            players[id] = Player(id, host, port, pubkey, seckey, keys,
+                                 dealer_keys, prf_version)
 
             # ID of player for which this config file was made
             owner_id = id
@@ -171,14 +235,23 @@ def load_config(source):
 
 
 def generate_configs(n, t, paillier=ViffPaillier(1024),
-                     addresses=None, prefix=None, skip_prss=False):
+                     addresses=None, prefix=None, skip_prss=False,
+                     prf_version=2, kdf=False):
     """Generate player configurations.
 
     Generates *n* configuration objects with a threshold of *t*. The
     *addresses* is an optional list of ``(host, port)`` pairs and
     *prefix* is a filename prefix. One can avoid generating keys for
     PRSS by setting *skip_prss* to True. This is useful when the
-    number of players is large.
+    number of players is large. The *prf_version* selects the PRF
+    used for PRSS, see :data:`viff.prss.PRF_VERSIONS`.
+
+    With *kdf* set to True, only a random seed is stored in the
+    configurations and the PRSS keys are derived from it when they
+    are loaded, see :func:`derive_prss_keys`. This keeps the files
+    small for many players, but it is insecure: every player can
+    derive every key. It is only meant for testing, and
+    :func:`load_config` warns when it loads such a configuration.
 
     The configurations are returned as :class:`ConfigObj` instances
     and can be saved to disk if desired.
@@ -237,24 +310,31 @@ def generate_configs(n, t, paillier=ViffPaillier(1024),
                 config[p_str(p)]['paillier']['seckey'] = key_pairs[p][1]
 
                 # Prepare the config file for the keys
+                config[p_str(p)]['prss_prf'] = prf_version
                 config[p_str(p)]['prss_keys'] = {}
                 config[p_str(p)]['prss_dealer_keys'] = {}
 
                 for d in players:
                     config[p_str(p)]['prss_dealer_keys'][d_str(d)] = {}
 
-    if not skip_prss:
-        max_unqualified_subsets = generate_subsets(players, n-t)
-        for subset in max_unqualified_subsets:
+    if skip_prss:
+        pass
+    elif kdf:
+        seed = generate_key()
+        for p in players:
+            configs[p][p_str(p)]['prss_kdf'] = dict(seed=seed, threshold=t)
+    else:
+        # The keys are generated one subset at a time, so that the
+        # subsets are never all kept in memory.
+        for subset in iter_subsets(sorted(players), n-t):
+            s = s_str(subset)
             key = generate_key()
             for player in subset:
                 config = configs[player]
-                config[p_str(player)]['prss_keys'][s_str(subset)] = key
+                config[p_str(player)]['prss_keys'][s] = key
 
-        for dealer in players:
-            d = d_str(dealer)
-            for subset in max_unqualified_subsets:
-                s = s_str(subset)
+            for dealer in players:
+                d = d_str(dealer)
                 key = generate_key()
                 for player in (subset | set([dealer])):
                     p = p_str(player)
@@ -30,3 +30,6 @@ INCONSISTENTHASH = 6
 OK               = 7
 HASH             = 8
 SIGNAL           = 9
+
+# Used for vectors of shares, see Runtime._expect_shares
+SHARES = 10
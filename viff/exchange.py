@@ -0,0 +1,283 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Transport-neutral message exchange. The players exchange frames
+made by :func:`pack_data` over pair-wise connections. The
+:class:`MessageExchanger` class decodes the frames and matches the
+data with whoever is waiting for it, but it does not know how the
+frames are sent. The Twisted backend is
+:class:`viff.runtime.ShareExchanger`, other backends can be plugged
+in by implementing :meth:`MessageExchanger.send_frame` and calling
+:meth:`MessageExchanger.frame_received` for every frame received.
+
+This module does not depend on Twisted.
+"""
+
+import struct
+from collections import deque
+
+from viff.constants import SHARE, SHARES
+
+
+def pack_data(program_counter, data_type, data):
+    """Encode data for transmission to another player.
+
+    The *program_counter* is a tuple of unsigned integers, the
+    *data_type* is an unsigned byte and *data* is a string.
+
+    The data is encoded as follows::
+
+      +---------+-----------+-----------+--------+--------------+
+      | pc_size | data_size | data_type |   pc   |     data     |
+      +---------+-----------+-----------+--------+--------------+
+        2 bytes   2 bytes      1 byte     varies      varies
+
+    The program counter takes up ``4 * pc_size`` bytes, the data
+    takes up ``data_size`` bytes:
+
+    >>> len(pack_data((0, 7), 0, "0x1f"))
+    17
+    """
+    pc_size = len(program_counter)
+    data_size = len(data)
+    fmt = "!HHB%dI%ds" % (pc_size, data_size)
+    t = (pc_size, data_size, data_type) + program_counter + (data,)
+    return struct.pack(fmt, *t)
+
+
+def unpack_data(packet):
+    """Decode a packet made by :func:`pack_data`.
+
+    Returns a ``(program_counter, data_type, data)`` triple and raises
+    :exc:`struct.error` if the packet is malformed:
+
+    >>> unpack_data(pack_data((0, 7), 0, "0x1f"))
+    ((0, 7), 0, '0x1f')
+    """
+    pc_size, data_size, data_type = struct.unpack("!HHB", packet[:5])
+    fmt = "!%dI%ds" % (pc_size, data_size)
+    unpacked = struct.unpack(fmt, packet[5:])
+    return unpacked[:pc_size], data_type, unpacked[-1]
+
+
+#: Largest packet which can be sent with a 2 byte length prefix.
+MAX_PACKET_SIZE = 2**16 - 1
+
+
+def _share_width(field):
+    """Number of hex digits used for each element of *field*."""
+    return len("%x" % (field.modulus - 1))
+
+
+def pack_shares(shares):
+    """Encode a list of field elements as a string.
+
+    All elements must belong to the same field. Each element takes up
+    the same number of hex digits, just enough for the largest
+    element of the field:
+
+    >>> from viff.field import GF
+    >>> Zp = GF(1031)
+    >>> pack_shares([Zp(1), Zp(1030), Zp(42)])
+    '00140602a'
+    """
+    if not shares:
+        return ""
+    width = _share_width(shares[0].field)
+    return "".join(["%0*x" % (width, share.value) for share in shares])
+
+
+def unpack_shares(field, data):
+    """Decode a string made by :func:`pack_shares`.
+
+    >>> from viff.field import GF
+    >>> Zp = GF(1031)
+    >>> unpack_shares(Zp, '00140602a')
+    [{1}, {1030}, {42}]
+    """
+    width = _share_width(field)
+    return [field(long(data[i:i+width], 16))
+            for i in range(0, len(data), width)]
+
+
+def shares_per_packet(program_counter, field):
+    """Return how many elements of *field* fit in a single packet
+    sent with the given *program_counter*.
+
+    Longer lists of shares are sent in several packets:
+
+    >>> from viff.field import GF
+    >>> shares_per_packet((0, 7), GF(1031))
+    21840
+    """
+    header = len(pack_data(program_counter, SHARES, ""))
+    return (MAX_PACKET_SIZE - header) // _share_width(field)
+
+
+class MessageExchanger(object):
+    """Send and receive data from one other player.
+
+    The exchanger does not know about the transport. A backend must
+    implement :meth:`send_frame` and call :meth:`frame_received`
+    with every frame it receives from the peer. Frames must be
+    delivered in the order they were sent.
+
+    Data is matched with the waiters registered by
+    :meth:`expect_data` on the ``(program_counter, data_type)``
+    pair. A waiter is any object with a ``callback`` method, usually
+    a Twisted :class:`Deferred`:
+
+    >>> class Waiter(object):
+    ...     def callback(self, data):
+    ...         print "Got", data
+    >>> class Loopback(MessageExchanger):
+    ...     def send_frame(self, frame):
+    ...         self.frame_received(frame)
+    >>> exchanger = Loopback()
+    >>> exchanger.expect_data((0, 1), SHARE, Waiter())
+    >>> exchanger.sendData((0, 1), SHARE, "0x2a")
+    Got 0x2a
+
+    Data received before anybody expects it is kept until then:
+
+    >>> exchanger.sendData((0, 2), SHARE, "0x7")
+    >>> exchanger.incoming_data
+    {((0, 2), 0): deque(['0x7'])}
+    >>> exchanger.expect_data((0, 2), SHARE, Waiter())
+    Got 0x7
+    """
+
+    def __init__(self):
+        self.peer_id = None
+        #: Data received before it was expected.
+        self.incoming_data = {}
+        #: Waiters expecting data which has not yet been received.
+        self.waiting_deferreds = {}
+        #: Statistics
+        self.sent_packets = 0
+        self.sent_bytes = 0
+
+    def send_frame(self, frame):
+        """Send a frame to the peer.
+
+        This must be implemented by the transport. The frame is a
+        string of at most :data:`MAX_PACKET_SIZE` bytes and the peer
+        must receive it as a single frame.
+        """
+        raise NotImplementedError
+
+    def frame_received(self, frame):
+        """Decode a frame from the peer and deliver its data.
+
+        A malformed frame is passed to :meth:`frame_error`.
+        """
+        try:
+            program_counter, data_type, data = unpack_data(frame)
+        except struct.error, e:
+            self.frame_error(e)
+        else:
+            self.deliver_data(program_counter, data_type, data)
+
+    def frame_error(self, error):
+        """Called with the :exc:`struct.error` of a malformed frame.
+
+        The error is raised again by default.
+        """
+        raise error
+
+    def data_ready(self, waiter, data):
+        """Pass received data to a waiter.
+
+        The data is simply given to the ``callback`` method of the
+        waiter by default.
+        """
+        waiter.callback(data)
+
+    def deliver_data(self, program_counter, data_type, data):
+        """Hand received data to whoever is waiting for it.
+
+        Data is matched on the ``(program_counter, data_type)`` pair.
+        If nobody is waiting yet, the data is stored in
+        :attr:`incoming_data` until :meth:`expect_data` asks for it.
+        """
+        key = (program_counter, data_type)
+
+        if key in self.waiting_deferreds:
+            deq = self.waiting_deferreds[key]
+            waiter = deq.popleft()
+            if not deq:
+                del self.waiting_deferreds[key]
+            self.data_ready(waiter, data)
+        else:
+            deq = self.incoming_data.setdefault(key, deque())
+            deq.append(data)
+
+    def expect_data(self, program_counter, data_type, waiter):
+        """Register a waiter for data from the peer.
+
+        The ``callback`` method of the *waiter* is called immediately
+        if the data has already been received.
+        """
+        key = (program_counter, data_type)
+
+        if key in self.incoming_data:
+            # We have already received some data from the other side.
+            deq = self.incoming_data[key]
+            data = deq.popleft()
+            if not deq:
+                del self.incoming_data[key]
+            waiter.callback(data)
+        else:
+            # We have not yet received anything from the other side.
+            deq = self.waiting_deferreds.setdefault(key, deque())
+            deq.append(waiter)
+
+    def sendData(self, program_counter, data_type, data):
+        """Send data to the peer.
+
+        The *program_counter* is a tuple of unsigned integers, the
+        *data_type* is an unsigned byte and *data* is a string.
+
+        The encoding is described in :func:`pack_data`.
+        """
+        packet = pack_data(program_counter, data_type, data)
+        self.send_frame(packet)
+        self.sent_packets += 1
+        self.sent_bytes += len(packet)
+
+    def sendShare(self, program_counter, share):
+        """Send a share.
+
+        The program counter and the share are converted to bytes and
+        sent to the peer.
+        """
+        self.sendData(program_counter, SHARE, hex(share.value))
+
+    def sendShares(self, program_counter, shares):
+        """Send a list of shares.
+
+        The shares must belong to the same field. They are encoded
+        with :func:`pack_shares` and split over as many packets as
+        needed, see :func:`shares_per_packet`. The list is received
+        with :meth:`viff.runtime.Runtime._expect_shares`.
+        """
+        if not shares:
+            return
+        step = shares_per_packet(program_counter, shares[0].field)
+        for i in range(0, len(shares), step):
+            self.sendData(program_counter, SHARES,
+                          pack_shares(shares[i:i+step]))
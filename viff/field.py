@@ -75,22 +75,60 @@ The reason for the slightly confusing error message is that ``x`` and
 ``z`` are instances of two *different* classes called ``GFElement``.
 """
 
-from gmpy import mpz
+from gmpy import mpz, numdigits, invert
 from math import log, ceil
 
+#: Python integer types. The gmpy integers are included since they
+#: are used for the values of elements in large fields.
+_integer_types = (int, long, type(mpz(0)))
+
+#: Fields with a modulus of at least this many bits store their
+#: values as gmpy integers. The arithmetic on large numbers is then
+#: done by GMP, which is much faster than Python's long integers.
+#: Multiplication with reduction is already faster with gmpy at 64
+#: bits, where the values no longer fit in a machine word.
+MPZ_THRESHOLD = 64
+
+#: Elements of prime fields with a modulus of at most this size are
+#: interned: each value is represented by a single shared instance,
+#: just like the elements of :class:`GF256`.
+INTERN_LIMIT = 1024
+
 
 class FieldElement(object):
     """Common base class for elements."""
 
+    # Elements only store their value, so we avoid the memory
+    # overhead of a per-instance dictionary.
+    __slots__ = ()
+
+    def __reduce__(self):
+        """Support for pickling.
+
+        Elements are recreated by calling their class with the value,
+        so interned elements are looked up again:
+
+        >>> import pickle
+        >>> pickle.loads(pickle.dumps(GF256(10))) is GF256(10)
+        True
+        """
+        return (self.__class__, (self.value,))
+
     def __int__(self):
         """Extract integer value from the field element.
 
         >>> int(GF256(10))
         10
         """
-        return self.value
+        return int(self.value)
 
-    __long__ = __int__
+    def __long__(self):
+        """Extract long integer value from the field element.
+
+        >>> long(GF256(10))
+        10L
+        """
+        return long(self.value)
 
     def split(self):
         """Splits self into bit array LSB first.
@@ -133,17 +171,25 @@ _add_table = [[None] * 256 for i in range(256)]
 class GF256(FieldElement):
     """Models an element of the GF(2^8) field."""
 
+    __slots__ = ['value']
+
     modulus = 256 #: GF(2^8) modulus, always 256.
+    characteristic = 2 #: Characteristic of GF(2^8).
 
-    def __init__(self, value):
-        """Initialize new element.
+    def __new__(cls, value):
+        """Return the element with the given value.
 
         The value given is modulo reduced so the following holds:
 
         >>> GF256(1) == GF256(257)
         True
+
+        There is only one instance per value:
+
+        >>> GF256(1) is GF256(257)
+        True
         """
-        self.value = value % self.modulus
+        return _gf256_elements[value % 256]
 
     def __add__(self, other):
         """Add this and another GF256 element.
@@ -303,6 +349,21 @@ class GF256(FieldElement):
 # We provide the class here to make the construction of new elements
 # easy in a polymorphic context.
 GF256.field = GF256
+# The field used for the evaluation points of Shamir sharings.
+GF256.scalar_field = GF256
+
+
+def _intern_elements(cls, modulus):
+    """Create a list with one instance of *cls* per value."""
+    elements = []
+    for value in range(modulus):
+        element = object.__new__(cls)
+        element.value = value
+        elements.append(element)
+    return elements
+
+#: The 256 instances of :class:`GF256`.
+_gf256_elements = _intern_elements(GF256, 256)
 
 
 def _generate_tables():
@@ -327,8 +388,7 @@ def _generate_tables():
         log_table[exp_table[c]] = c
     exp_table[255] = exp_table[0]
 
-    # Don't waste memory for several instances with the same value.
-    inst_table = [GF256(i) for i in range(256)]
+    inst_table = _gf256_elements
 
     for x in range(256):
         for y in range(256):
@@ -388,16 +448,47 @@ def GF(modulus):
     if not mpz(modulus).is_prime():
         raise ValueError("%d is not a prime" % modulus)
 
+    field = _make_field(modulus, numdigits(modulus, 2) >= MPZ_THRESHOLD)
+    _field_cache[modulus] = field
+    return field
+
+def _unpickle_gf(modulus, value):
+    """Recreate a pickled element of ``GF(modulus)``."""
+    return GF(modulus)(value)
+
+def _make_field(modulus, use_mpz):
+    """Create a new field class for a prime *modulus*.
+
+    If *use_mpz* is true, the values of the field elements are stored
+    as gmpy integers, otherwise they are Python integers. The
+    :func:`GF` function makes the choice based on
+    :data:`MPZ_THRESHOLD`. The two kinds of fields behave identically:
+
+    >>> Zp = _make_field(1031, False)
+    >>> Zq = _make_field(1031, True)
+    >>> (Zp(1000) * Zp(77)).value == (Zq(1000) * Zq(77)).value
+    True
+    >>> type(Zq(10).value)
+    <type 'mpz'>
+    """
+
     # Define a new class representing the field. This class will be
     # returned at the end of the function.
     class GFElement(FieldElement):
 
+        __slots__ = ['value']
+
         def __init__(self, value):
             self.value = value % self.modulus
 
+        def __reduce__(self):
+            # The class is local to this function, so the element is
+            # recreated through GF.
+            return (_unpickle_gf, (long(self.modulus), long(self.value)))
+
         def __add__(self, other):
             """Addition."""
-            if not isinstance(other, (GFElement, int, long)):
+            if not isinstance(other, operand_types):
                 return NotImplemented
             try:
                 # We can do a quick test using 'is' here since
@@ -412,7 +503,7 @@ def GF(modulus):
 
         def __sub__(self, other):
             """Subtraction."""
-            if not isinstance(other, (GFElement, int, long)):
+            if not isinstance(other, operand_types):
                 return NotImplemented
             try:
                 assert self.field is other.field, "Fields must be identical"
@@ -426,7 +517,7 @@ def GF(modulus):
 
         def __xor__(self, other):
             """Xor for bitvalues."""
-            if not isinstance(other, (GFElement, int, long)):
+            if not isinstance(other, operand_types):
                 return NotImplemented
             try:
                 assert self.field is other.field, "Fields must be identical"
@@ -440,7 +531,7 @@ def GF(modulus):
 
         def __mul__(self, other):
             """Multiplication."""
-            if not isinstance(other, (GFElement, int, long)):
+            if not isinstance(other, operand_types):
                 return NotImplemented
             try:
                 assert self.field is other.field, "Fields must be identical"
@@ -466,22 +557,9 @@ def GF(modulus):
             """
             if self.value == 0:
                 raise ZeroDivisionError("Cannot invert zero")
-
-            def extended_gcd(a, b):
-                """The extended Euclidean algorithm."""
-                x = 0
-                lastx = 1
-                y = 1
-                lasty = 0
-                while b != 0:
-                    quotient = a // b
-                    a, b = b, a % b
-                    x, lastx = lastx - quotient*x, x
-                    y, lasty = lasty - quotient*y, y
-                return (lastx, lasty, a)
-
-            inverse = extended_gcd(self.value, self.modulus)[0]
-            return GFElement(inverse)
+            # Convert back since elements of small fields have Python
+            # integers as values.
+            return GFElement(long(invert(self.value, self.modulus)))
 
         def __div__(self, other):
             """Division."""
@@ -593,11 +671,262 @@ def GF(modulus):
             return self.value != 0
 
     GFElement.modulus = modulus
+    GFElement.characteristic = modulus
     GFElement.field = GFElement
+    GFElement.scalar_field = GFElement
+
+    # Types accepted as the other operand in arithmetic operations.
+    operand_types = (GFElement,) + _integer_types
+
+    if use_mpz:
+        mpz_modulus = mpz(modulus)
+
+        def __init__(self, value):
+            self.value = value % mpz_modulus
+        GFElement.__init__ = __init__
+    elif modulus <= INTERN_LIMIT:
+        elements = _intern_elements(GFElement, modulus)
+
+        def __new__(cls, value):
+            return elements[value % modulus]
+        GFElement.__new__ = staticmethod(__new__)
+        # The values are set once and for all by _intern_elements.
+        del GFElement.__init__
 
-    _field_cache[modulus] = GFElement
     return GFElement
 
+def batch_invert(elements):
+    """Invert a list of field elements.
+
+    Montgomery's trick is used so that only a single inversion is
+    done, at the cost of three multiplications per element. This is
+    much cheaper than inverting each element by itself:
+
+    >>> Zp = GF(17)
+    >>> batch_invert([Zp(2), Zp(3), Zp(5)])
+    [{9}, {6}, {7}]
+    >>> batch_invert([GF256(2), GF256(3)]) == [~GF256(2), ~GF256(3)]
+    True
+
+    All elements must be non-zero:
+
+    >>> batch_invert([Zp(2), Zp(0)])
+    Traceback (most recent call last):
+        ...
+    ZeroDivisionError: Cannot invert zero
+    """
+    if not elements:
+        return []
+
+    # The products of all prefixes of the list.
+    products = [elements[0]]
+    for element in elements[1:]:
+        products.append(products[-1] * element)
+
+    inverse = ~products[-1]
+    result = [None] * len(elements)
+    for i in range(len(elements) - 1, 0, -1):
+        # Here inverse is the inverse of products[i].
+        result[i] = inverse * products[i - 1]
+        inverse = inverse * elements[i]
+    result[0] = inverse
+    return result
+
+def _unpickle_packed(width, value):
+    """Recreate a pickled element of ``PackedGF2(width)``."""
+    return PackedGF2(width)(value)
+
+#: Cached packed fields, indexed by their width.
+_packed_field_cache = {}
+
+def PackedGF2(width):
+    """Generate a field for packed vectors of *width* bits.
+
+    An element holds *width* independent elements of GF(2^8), called
+    lanes, stored bit-sliced in a single Python integer: bit *i* of
+    lane *j* is bit ``i * width + j`` of the :attr:`value`. Bit
+    vectors are the elements where all lanes are 0 or 1, and their
+    value is simply the bit vector itself:
+
+    >>> F = PackedGF2(8)
+    >>> x = F(0b00001111)
+    >>> y = F(0b01010101)
+
+    Addition is xor and multiplication of bit vectors is bitwise and.
+    Both are computed on all lanes at once:
+
+    >>> x + y
+    <0x5a>
+    >>> x * y
+    <0x5>
+
+    Multiplying with a :class:`GF256` element multiplies every lane
+    with it. This is how Shamir sharing works: the evaluation points
+    are taken from :attr:`scalar_field` and so every lane is shared
+    independently over GF(2^8).
+    """
+    if width in _packed_field_cache:
+        return _packed_field_cache[width]
+
+    #: Mask selecting a single bit plane.
+    mask = (1 << width) - 1
+
+    def reduce_planes(planes):
+        """Reduce product *planes* modulo x^8 + x^4 + x^3 + x + 1."""
+        for i in range(14, 7, -1):
+            plane = planes[i]
+            if plane:
+                planes[i-4] ^= plane
+                planes[i-5] ^= plane
+                planes[i-7] ^= plane
+                planes[i-8] ^= plane
+        value = 0
+        for i in range(7, -1, -1):
+            value = (value << width) | planes[i]
+        return value
+
+    class PackedElement(FieldElement):
+        """A packed vector of GF(2^8) elements."""
+
+        __slots__ = ['value']
+
+        def __init__(self, value):
+            self.value = value % self.modulus
+
+        def __reduce__(self):
+            return (_unpickle_packed, (width, long(self.value)))
+
+        def planes(self):
+            """Split the value into its eight bit planes."""
+            value = self.value
+            return [(value >> (i * width)) & mask for i in range(8)]
+
+        def lanes(self):
+            """Return the lanes as a list of :class:`GF256` elements.
+
+            >>> PackedGF2(3)(0b110).lanes()
+            [[0], [1], [1]]
+            """
+            planes = self.planes()
+            return [GF256(sum([((planes[i] >> j) & 1) << i
+                               for i in range(8)]))
+                    for j in range(width)]
+
+        def __add__(self, other):
+            """Addition, which is xor of the lanes.
+
+            A :class:`GF256` element is added to all lanes.
+            """
+            if isinstance(other, PackedElement):
+                return PackedElement(self.value ^ other.value)
+            elif isinstance(other, GF256):
+                return self + PackedElement.constant(other)
+            elif isinstance(other, (int, long)):
+                return PackedElement(self.value ^ other)
+            else:
+                return NotImplemented
+
+        __radd__ = __sub__ = __rsub__ = __xor__ = __rxor__ = __add__
+
+        def __mul__(self, other):
+            """Multiplication of the lanes.
+
+            A :class:`GF256` element is multiplied onto all lanes,
+            which is cheaper than a general multiplication.
+            """
+            if isinstance(other, GF256):
+                planes = self.planes()
+                product = [0] * 15
+                for j in range(8):
+                    if (other.value >> j) & 1:
+                        for i in range(8):
+                            product[i+j] ^= planes[i]
+                return PackedElement(reduce_planes(product))
+            elif isinstance(other, (int, long)):
+                other = PackedElement(other)
+            elif not isinstance(other, PackedElement):
+                return NotImplemented
+
+            # Schoolbook multiplication of the bit-sliced polynomials.
+            a = self.planes()
+            b = other.planes()
+            product = [0] * 15
+            for i in range(8):
+                if a[i]:
+                    for j in range(8):
+                        product[i+j] ^= a[i] & b[j]
+            return PackedElement(reduce_planes(product))
+
+        __rmul__ = __mul__
+
+        def __div__(self, other):
+            """Division by a :class:`GF256` element."""
+            if not isinstance(other, GF256):
+                return NotImplemented
+            return self * ~other
+
+        __truediv__ = __div__
+
+        def __neg__(self):
+            """Negation, which is the identity."""
+            return self
+
+        def __eq__(self, other):
+            """Equality test."""
+            try:
+                return self.value == other.value
+            except AttributeError:
+                return self.value == other
+
+        def __ne__(self, other):
+            """Inequality test."""
+            return not self == other
+
+        def __hash__(self):
+            """Hash value."""
+            return hash((self.field, self.value))
+
+        def __nonzero__(self):
+            """Truth value, false only for the zero vector."""
+            return self.value != 0
+
+        def __repr__(self):
+            return "<%#x>" % self.value
+
+        __str__ = __repr__
+
+    def constant(value):
+        """Return an element with *value* in every lane."""
+        value = int(value) % 256
+        planes = [mask * ((value >> i) & 1) for i in range(8)]
+        return PackedElement(reduce_planes(planes + [0] * 7))
+    PackedElement.constant = staticmethod(constant)
+
+    def from_lanes(values):
+        """Return the element with the given lane *values*.
+
+        >>> F = PackedGF2(3)
+        >>> F.from_lanes([GF256(1), GF256(7), GF256(0)]).lanes()
+        [[1], [7], [0]]
+        """
+        assert len(values) == width, "Wrong number of lanes"
+        planes = [0] * 8
+        for j, value in enumerate(values):
+            value = int(value) % 256
+            for i in range(8):
+                planes[i] |= ((value >> i) & 1) << j
+        return PackedElement(reduce_planes(planes + [0] * 7))
+    PackedElement.from_lanes = staticmethod(from_lanes)
+
+    PackedElement.width = width
+    PackedElement.modulus = 1 << (8 * width)
+    PackedElement.characteristic = 2
+    PackedElement.field = PackedElement
+    PackedElement.scalar_field = GF256
+
+    _packed_field_cache[width] = PackedElement
+    return PackedElement
+
 def FakeGF(modulus):
     """Construct a fake field.
 
@@ -625,6 +954,8 @@ def FakeGF(modulus):
     class FakeFieldElement(FieldElement):
         """Fake field which does no computations."""
 
+        __slots__ = ['value']
+
         def __init__(self, value):
             """Create a fake field element.
 
@@ -651,7 +982,9 @@ def FakeGF(modulus):
         __repr__ = __str__ = lambda self: "{{%d}}" % self.value
 
     FakeFieldElement.field = FakeFieldElement
+    FakeFieldElement.scalar_field = FakeFieldElement
     FakeFieldElement.modulus = modulus
+    FakeFieldElement.characteristic = modulus
     return FakeFieldElement
 
 if __name__ == "__main__":
@@ -24,6 +24,11 @@ type that acts like a number, including :class:`viff.field.GF256` and
 
 from __future__ import division
 
+import operator
+
+from viff.field import batch_invert
+from viff.vector import FieldVector, mat_vec
+
 class Matrix(object):
     """A matrix."""
 
@@ -146,8 +151,17 @@ class Matrix(object):
         Traceback (most recent call last):
             ...
         ValueError: Matrix dimensions do not match for multiplication
+
+        Multiplying with a :class:`viff.vector.FieldVector` gives the
+        matrix-vector product as a new vector.
         """
 
+        if isinstance(other, FieldVector):
+            if self.n != len(other):
+                raise ValueError('Matrix dimensions do not match for '
+                                 'multiplication')
+            return mat_vec(self.rows, other)
+
         if not isinstance(other, Matrix):
             result = Matrix(self.m, self.n)
             for i in range(0, self.m):
@@ -255,13 +269,21 @@ def hyper(n, field):
      [ {3} {39}  {6}]
      [ {6} {32} {10}]]
     """
+    # The denominators only depend on the column, so we invert them
+    # all at once.
+    denominators = [reduce(operator.mul,
+                           [field(j-k) for k in range(0, n) if k != j],
+                           field(1))
+                    for j in range(0, n)]
+    inverses = batch_invert(denominators)
+
     result = Matrix(n, n)
     for i in range(0, n):
         for j in range(0, n):
-            product = 1
+            product = inverses[j]
             for k in range(0, n):
                 if k != j:
-                    product *= field(n+i-k)/field(j-k)
+                    product *= field(n+i-k)
             result[i, j] = product
     return result
 
@@ -0,0 +1,261 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Number-theoretic transforms. A prime field *Zp* has a primitive
+root of unity of order *N* when *N* divides *p* - 1. With *N* a power
+of two, a polynomial of degree less than *N* can then be evaluated in
+all powers of the root, or interpolated from them, using O(*N* log
+*N*) field operations instead of O(*N*^2).
+
+This module uses the transform for Shamir sharing with the powers of
+a root of unity as evaluation points, and for multiplying with a
+hyper-invertible matrix. Suitable primes can be found with
+:func:`viff.util.find_prime`.
+"""
+
+from itertools import count
+
+from viff import shamir
+from viff.matrix import Matrix
+from viff.util import rand
+
+#: Cached roots of unity, see `root_of_unity`.
+_roots = {}
+
+
+def _next_power_of_two(n):
+    """Return the smallest power of two which is at least *n*."""
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+def root_of_unity(field, order):
+    """Return a primitive root of unity of the given *order*.
+
+    The *order* must be a power of two. None is returned if *field*
+    has no such root:
+
+    >>> from field import GF, GF256
+    >>> root_of_unity(GF(17), 8)
+    {9}
+    >>> print root_of_unity(GF(19), 8)
+    None
+    >>> print root_of_unity(GF256, 2)
+    None
+    """
+    key = (field, order)
+    try:
+        return _roots[key]
+    except KeyError:
+        root = None
+        modulus = long(field.modulus)
+        if field.characteristic != 2 and (modulus - 1) % order == 0:
+            for g in count(2):
+                w = pow(g, (modulus - 1) // order, modulus)
+                if order == 1 or pow(w, order // 2, modulus) != 1:
+                    root = field(w)
+                    break
+        _roots[key] = root
+        return root
+
+
+def _transform(values, root, modulus):
+    """Radix-2 transform of a list of integers."""
+    n = len(values)
+    if n == 1:
+        return values
+    square = root * root % modulus
+    even = _transform(values[0::2], square, modulus)
+    odd = _transform(values[1::2], square, modulus)
+    half = n // 2
+    result = [0] * n
+    w = 1
+    for k in range(half):
+        t = w * odd[k] % modulus
+        result[k] = (even[k] + t) % modulus
+        result[k+half] = (even[k] - t) % modulus
+        w = w * root % modulus
+    return result
+
+
+def ntt(values, root):
+    """Evaluate a polynomial in the powers of *root*.
+
+    The *values* are the coefficients of the polynomial, starting
+    with the constant term. The length of *values* must be a power of
+    two and equal to the order of *root*. The result is the value of
+    the polynomial in each power of *root*:
+
+    >>> from field import GF
+    >>> Zp = GF(17)
+    >>> root = root_of_unity(Zp, 4)
+    >>> ntt([Zp(1), Zp(2), Zp(0), Zp(0)], root)
+    [{3}, {10}, {16}, {9}]
+    """
+    field = root.field
+    modulus = long(field.modulus)
+    result = _transform([long(v.value) for v in values],
+                        long(root.value), modulus)
+    return [field(v) for v in result]
+
+
+def intt(values, root):
+    """Interpolate a polynomial from its values in the powers of *root*.
+
+    This is the inverse of :func:`ntt`:
+
+    >>> from field import GF
+    >>> Zp = GF(17)
+    >>> root = root_of_unity(Zp, 4)
+    >>> intt(ntt([Zp(1), Zp(2), Zp(0), Zp(0)], root), root)
+    [{1}, {2}, {0}, {0}]
+    """
+    field = root.field
+    modulus = long(field.modulus)
+    result = _transform([long(v.value) for v in values],
+                        long((~root).value), modulus)
+    scale = long((~field(len(values))).value)
+    return [field(v * scale) for v in result]
+
+
+def share(secret, threshold, num_players):
+    """Shamir share *secret* using a number-theoretic transform.
+
+    This works like :func:`viff.shamir.share`, except that the
+    evaluation points are the powers of a root of unity whose order
+    is the smallest power of two of at least *num_players*. The
+    result is a list of ``(point, share)`` pairs, which can be
+    recombined with :func:`recombine` or
+    :func:`viff.shamir.recombine`:
+
+    >>> from field import GF
+    >>> Zp = GF(17)
+    >>> shares = share(Zp(7), 1, 3)
+    >>> [point for point, _ in shares]
+    [{1}, {13}, {16}]
+    >>> recombine(shares[1:])
+    {7}
+    """
+    assert threshold >= 0 and threshold < num_players, \
+        "Threshold out of range"
+
+    field = secret.field
+    size = _next_power_of_two(num_players)
+    root = root_of_unity(field, size)
+    assert root is not None, "No root of unity of order %d" % size
+
+    coefficients = [secret]
+    for j in range(threshold):
+        coefficients.append(field(rand.randint(0, long(field.modulus) - 1)))
+    coefficients += [field(0)] * (size - threshold - 1)
+
+    points = [field(1)]
+    for i in range(1, num_players):
+        points.append(points[-1] * root)
+    return zip(points, ntt(coefficients, root))[:num_players]
+
+
+def recombine(shares):
+    """Recombine a list of ``(point, share)`` pairs.
+
+    If the points are all powers of a root of unity, the secret is
+    simply the average of the shares. Otherwise the shares are
+    recombined with :func:`viff.shamir.recombine`.
+    """
+    size = len(shares)
+    points = [x for x, _ in shares]
+    if size > 1 and size == _next_power_of_two(size):
+        root = points[1]
+        if points[0] == 1 and root == root_of_unity(root.field, size):
+            for i in range(2, size):
+                if points[i] != points[i-1] * root:
+                    break
+            else:
+                return sum([y for _, y in shares]) * ~root.field(size)
+    return shamir.recombine(shares)
+
+
+def hyper_supported(field, n):
+    """Return True if :func:`hyper_mul` works for *n* by *n* matrices
+    over *field*."""
+    return root_of_unity(field, 2 * _next_power_of_two(n)) is not None
+
+
+def hyper_mul(vector):
+    """Multiply *vector* with a hyper-invertible matrix.
+
+    Let *N* be the smallest power of two of at least the length of
+    *vector* and let *w* be a primitive root of unity of order 2 *
+    *N*. The matrix maps the values of a polynomial of degree less
+    than *N* in the even powers of *w* to its values in the odd
+    powers of *w*. Any such matrix is hyper-invertible, and so is
+    its upper-left corner, which is used for shorter vectors.
+
+    The product is computed in O(*N* log *N*) field operations:
+
+    >>> from field import GF
+    >>> Zp = GF(17)
+    >>> hyper_mul([Zp(1), Zp(2), Zp(3)])
+    [{1}, {12}, {15}]
+    >>> print hyper(3, Zp) * Matrix([[Zp(1)], [Zp(2)], [Zp(3)]])
+    [[ {1}]
+     [{12}]
+     [{15}]]
+    """
+    n = len(vector)
+    field = vector[0].field
+    size = _next_power_of_two(n)
+    w = root_of_unity(field, 2 * size)
+    assert w is not None, "No root of unity of order %d" % (2 * size)
+
+    square = w * w
+    padded = list(vector) + [field(0)] * (size - n)
+    coefficients = intt(padded, square)
+    # Shifting the evaluation points from the subgroup generated by
+    # w^2 to its coset w * <w^2> multiplies coefficient j by w^j.
+    scale = field(1)
+    for j in range(size):
+        coefficients[j] *= scale
+        scale *= w
+    return ntt(coefficients, square)[:n]
+
+
+def hyper(n, field):
+    """Makes the *n* times *n* hyper-invertible matrix used by
+    :func:`hyper_mul`.
+
+    This is mostly useful for testing, since it takes O(*n*^2 log
+    *n*) field operations.
+
+    >>> from field import GF
+    >>> print hyper(2, GF(17))
+    [[ {7} {11}]
+     [{11}  {7}]]
+    """
+    columns = []
+    for j in range(n):
+        unit = [field(0)] * n
+        unit[j] = field(1)
+        columns.append(hyper_mul(unit))
+    return Matrix(columns).transpose()
+
+
+if __name__ == "__main__":
+    import doctest    #pragma NO COVER
+    doctest.testmod() #pragma NO COVER
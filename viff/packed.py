@@ -0,0 +1,171 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Passively secure runtime using packed Shamir sharings. Each
+sharing holds several secrets at once, see
+:func:`viff.shamir.share_packed`, and so a single operation on shares
+works on all the secrets in parallel.
+
+The number of secrets per sharing is given by the ``--packing``
+option. With *k* secrets and threshold *t*, the sharings have degree
+*t* + *k* - 1, and multiplication requires that the number of
+players is at least 2(*t* + *k*) - 1.
+"""
+
+from viff import shamir
+from viff.passive import PassiveRuntime
+from viff.runtime import Share, gather_shares
+
+
+class PackedShamirRuntime(PassiveRuntime):
+    """Runtime for packed Shamir sharings.
+
+    Shares are created with :meth:`shamir_share` from lists of
+    numbers and opened with :meth:`open` into lists of field
+    elements. Addition and multiplication of two shares are done
+    element-wise. Adding or multiplying with a constant applies the
+    constant to every secret in the sharing.
+
+    Other operations of :class:`~viff.passive.PassiveRuntime`, such
+    as PRSS and comparisons, are not supported.
+    """
+
+    def __init__(self, player, threshold, options=None):
+        """Initialize runtime."""
+        PassiveRuntime.__init__(self, player, threshold, options)
+        #: Number of secrets in each sharing.
+        self.packing = self.options.packing
+        #: Degree of the sharing polynomials.
+        self.degree = threshold + self.packing - 1
+
+    def _recombine(self, shares):
+        """Recombine the secrets of a packed sharing."""
+        return shamir.recombine_packed(shares, self.packing)
+
+    def open(self, share, receivers=None, threshold=None):
+        """Open a packed sharing.
+
+        The result is a list with the :attr:`packing` secrets. By
+        default :attr:`degree` + 1 shares are used for
+        reconstruction.
+        """
+        if threshold is None:
+            threshold = self.degree
+        return PassiveRuntime.open(self, share, receivers, threshold)
+
+    def output(self, share, receivers=None, threshold=None):
+        return self.open(share, receivers, threshold)
+
+    def shamir_share(self, inputters, field, number=None, threshold=None):
+        """Secret share a list of numbers using packed sharings.
+
+        This works like :meth:`~viff.passive.PassiveRuntime.shamir_share`
+        except that the input of each player is a list of at most
+        :attr:`packing` numbers. Shorter lists are padded with zeros.
+        The *threshold* is the privacy threshold and defaults to
+        :attr:`threshold`.
+        """
+        assert number is None or self.id in inputters
+        if threshold is None:
+            threshold = self.threshold
+
+        results = []
+        for peer_id in inputters:
+            # Unique program counter per input.
+            self.increment_pc()
+
+            if peer_id == self.id:
+                assert len(number) <= self.packing, "Too many numbers"
+                secrets = [field(n) for n in number]
+                secrets += [field(0)] * (self.packing - len(secrets))
+                pc = tuple(self.program_counter)
+                shares = shamir.share_packed(secrets, threshold,
+                                             self.num_players)
+                for other_id, share in shares:
+                    if other_id.value == self.id:
+                        results.append(Share(self, share.field, share))
+                    else:
+                        self.protocols[other_id.value].sendShare(pc, share)
+            else:
+                results.append(self._expect_share(peer_id, field))
+
+        # do actual communication
+        self.activate_reactor()
+
+        # Unpack a singleton list.
+        if len(results) == 1:
+            return results[0]
+        else:
+            return results
+
+    def mul(self, share_a, share_b):
+        """Multiplication of packed shares.
+
+        The product of the shares is a sharing of degree 2 *
+        :attr:`degree`. To reduce the degree, each of the first 2 *
+        :attr:`degree` + 1 players reshares a vector with its share
+        multiplied by the Lagrange coefficient of each secret. The
+        sum of these sharings is a sharing of the products.
+
+        Communication cost: 2 * :attr:`degree` + 1 packed sharings.
+        """
+        assert isinstance(share_a, Share), \
+            "share_a must be a Share."
+
+        if not isinstance(share_b, Share):
+            return PassiveRuntime.mul(self, share_a, share_b)
+
+        product_degree = 2 * self.degree
+        assert product_degree < self.num_players, \
+            "Too few players for packed multiplication"
+
+        def reshare(product):
+            field = product.field
+            xs = [field(i) for i in range(1, product_degree + 2)]
+            pc = tuple(self.program_counter)
+
+            if self.id <= product_degree + 1:
+                vector = [product *
+                          shamir.recombination_vector(xs, field(-l))[self.id-1]
+                          for l in range(1, self.packing + 1)]
+                shares = shamir.share_packed(vector, self.threshold,
+                                             self.num_players)
+                for peer_id, share in shares:
+                    if peer_id.value == self.id:
+                        own_share = share
+                    else:
+                        self.protocols[peer_id.value].sendShare(pc, share)
+
+            received = []
+            for peer_id in range(1, product_degree + 2):
+                if peer_id == self.id:
+                    received.append(Share(self, field, own_share))
+                else:
+                    received.append(self._expect_share(peer_id, field))
+
+            result = gather_shares(received)
+            result.addCallback(sum)
+            return result
+
+        result = gather_shares([share_a, share_b])
+        result.addCallback(lambda (a, b): a * b)
+        self.schedule_callback(result, reshare)
+
+        # do actual communication
+        self.activate_reactor()
+
+        return result
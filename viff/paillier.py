@@ -184,17 +184,26 @@ class PaillierRuntime(Runtime):
             pc = tuple(self.program_counter)
             send_data = self.protocols[self.peer.id].sendData
 
-            if hash(pc) % 2 == self.id:
+            if hash(pc) % 2 == self.id % 2:
                 # We play the role of P1.
                 a1, b1 = a, b
-                enc_a1 = encrypt(a1.value, self.player.pubkey)
-                enc_b1 = encrypt(b1.value, self.player.pubkey)
-                send_data(pc, PAILLIER, str(enc_a1))
-                send_data(pc, PAILLIER, str(enc_b1))
+                # The randomness is chosen here and not in the worker
+                # processes to keep the runs reproducible.
+                pubkey = self.player.pubkey
+                r_a = rand.randint(1, long(pubkey['n']))
+                r_b = rand.randint(1, long(pubkey['n']))
+                enc = self.offload_many(encrypt_r, [(a1.value, r_a, pubkey),
+                                                    (b1.value, r_b, pubkey)])
+
+                def send_encryptions((enc_a1, enc_b1)):
+                    send_data(pc, PAILLIER, str(enc_a1))
+                    send_data(pc, PAILLIER, str(enc_b1))
+                enc.addCallback(send_encryptions)
 
                 enc_c1 = Share(self, field)
                 self._expect_data(self.peer.id, PAILLIER, enc_c1)
-                c1 = enc_c1.addCallback(decrypt, self.player.seckey)
+                c1 = enc_c1.addCallback(lambda c: self.offload(
+                        decrypt, long(c), self.player.seckey))
                 c1.addCallback(lambda c: long(c) + a1 * b1)
                 return c1
             else:
@@ -202,22 +211,23 @@ class PaillierRuntime(Runtime):
                 a2, b2 = a, b
                 enc_a1 = Deferred()
                 self._expect_data(self.peer.id, PAILLIER, enc_a1)
-                enc_a1.addCallback(long)
                 enc_b1 = Deferred()
                 self._expect_data(self.peer.id, PAILLIER, enc_b1)
-                enc_b1.addCallback(long)
 
                 nsq = self.peer.pubkey['n']**2
                 # Calculate a1 * b2 and b1 * a2 inside the encryption.
-                enc_a1_b2 = enc_a1.addCallback(pow, b2.value, nsq)
-                enc_b1_a2 = enc_b1.addCallback(pow, a2.value, nsq)
+                enc_a1_b2 = enc_a1.addCallback(
+                    lambda c: self.offload(pow, long(c), b2.value, nsq))
+                enc_b1_a2 = enc_b1.addCallback(
+                    lambda c: self.offload(pow, long(c), a2.value, nsq))
 
                 # Chose and encrypt r.
                 r = rand.randint(0, 2 * field.modulus**2 + 2**k)
-                enc_r = encrypt(r, self.peer.pubkey)
+                r_enc = rand.randint(1, long(self.peer.pubkey['n']))
+                enc_r = self.offload(encrypt_r, r, r_enc, self.peer.pubkey)
 
-                c1 = gatherResults([enc_a1_b2, enc_b1_a2])
-                c1.addCallback(lambda (a,b): a * b * enc_r)
+                c1 = gatherResults([enc_a1_b2, enc_b1_a2, enc_r])
+                c1.addCallback(lambda (a, b, e): (a * b * e) % nsq)
                 c1.addCallback(lambda c: send_data(pc, PAILLIER, str(c)))
 
                 c2 = a2 * b2 - r
@@ -23,13 +23,28 @@ import operator
 
 from viff import shamir
 from viff.runtime import Runtime, Share, ShareList, gather_shares, preprocess
-from viff.prss import prss, prss_lsb, prss_zero, prss_multi
+from viff.prss import prss, prss_lsb, prss_zero, prss_multi, prss_secrets, \
+    PRSSBuffer
 from viff.field import GF256, FieldElement
 from viff.util import rand, profile
 
 from twisted.internet.defer import gatherResults
 
 
+def _combine_vectors(field, coefficients, vectors):
+    """Return the linear combination of *vectors* with the given
+    *coefficients*, computed element-wise."""
+    if field.characteristic == 2:
+        return [sum(map(operator.mul, column, coefficients))
+                for column in zip(*vectors)]
+    # Work with integers and reduce once for each element.
+    modulus = long(field.modulus)
+    integers = [long(c.value) for c in coefficients]
+    return [field(sum([c * s.value for c, s in zip(integers, column)])
+                  % modulus)
+            for column in zip(*vectors)]
+
+
 class PassiveRuntime(Runtime):
     """The VIFF runtime.
 
@@ -53,6 +68,42 @@ class PassiveRuntime(Runtime):
     def __init__(self, player, threshold, options=None):
         """Initialize runtime."""
         Runtime.__init__(self, player, threshold, options)
+        self.prss_buffer = PRSSBuffer(self.options.prss_buffer,
+                                      schedule=self.call_soon)
+        if self.options.resharers:
+            resharers = sorted(map(int, self.options.resharers.split(",")))
+        else:
+            resharers = range(1, 2*threshold+2)
+        #: The 2t+1 players whose reshared products are used for
+        #: degree reduction in :meth:`mul` and :meth:`mul_many`. They
+        #: are checked by :meth:`check_resharers` when multiplying
+        #: since the players are only known once connected.
+        self.resharers = resharers
+
+    def check_resharers(self):
+        """Check that :attr:`resharers` are 2t+1 distinct players.
+
+        Raises :exc:`ValueError` otherwise.
+        """
+        resharers = set(self.resharers)
+        if len(resharers) != len(self.resharers) or \
+                len(resharers) != 2*self.threshold+1:
+            raise ValueError("Exactly 2t+1 = %d distinct resharers are "
+                             "needed, got %s"
+                             % (2*self.threshold+1, list(self.resharers)))
+        unknown = resharers - set(self.players)
+        if unknown:
+            raise ValueError("Resharers %s are not players"
+                             % sorted(unknown))
+
+    def print_transferred_data(self):
+        """Print the amount of transferred data and the hit rate of
+        the PRSS buffer."""
+        Runtime.print_transferred_data(self)
+        if self.prss_buffer.depth:
+            print "PRSS buffer: %d hits, %d misses (%.1f%%)" % \
+                (self.prss_buffer.hits, self.prss_buffer.misses,
+                 100 * self.prss_buffer.hit_rate())
 
     def output(self, share, receivers=None, threshold=None):
         return self.open(share, receivers, threshold)
@@ -85,7 +136,7 @@ class PassiveRuntime(Runtime):
             assert len(shares) > threshold
             result = ShareList(shares, threshold+1)
             result.addCallback(filter_good_shares)
-            result.addCallback(shamir.recombine)
+            result.addCallback(self._recombine)
             return result
 
         def exchange(share):
@@ -99,10 +150,13 @@ class PassiveRuntime(Runtime):
                 deferreds = []
                 for peer_id in self.players:
                     if peer_id == self.id:
-                        d = Share(self, share.field, (share.field(peer_id), share))
+                        d = Share(self, share.field,
+                                  (share.field.scalar_field(peer_id), share))
                     else:
                         d = self._expect_share(peer_id, share.field)
-                        d.addCallback(lambda s, peer_id: (s.field(peer_id), s), peer_id)
+                        d.addCallback(lambda s, peer_id:
+                                          (s.field.scalar_field(peer_id), s),
+                                      peer_id)
                     deferreds.append(d)
                 return recombine(deferreds)
 
@@ -115,6 +169,87 @@ class PassiveRuntime(Runtime):
         if self.id in receivers:
             return result
 
+    def open_many(self, shares, receivers=None, threshold=None):
+        """Open a list of secret sharings in one round.
+
+        This works like :meth:`open`, but each player sends all its
+        shares to each receiver in a single message. The values are
+        recombined from the first *threshold* + 1 messages to arrive,
+        using a single Lagrange vector for the whole list. The result
+        is a :class:`~viff.runtime.Share` whose value is the list of
+        opened values.
+
+        Communication cost: every player sends one message with
+        ``len(shares)`` elements to each receiving player.
+        """
+        assert shares, "No shares to open."
+        # all players receive result by default
+        if receivers is None:
+            receivers = self.players.keys()
+        if threshold is None:
+            threshold = self.threshold
+        field = shares[0].field
+        quantity = len(shares)
+
+        def recombine(results):
+            # Filter results, which is a list of (success, (x, vector))
+            # pairs.
+            pairs = [result[1] for result in results
+                     if result is not None and result[0]][:threshold+1]
+            xs = [x for x, _ in pairs]
+            coefficients = shamir.recombination_vector(xs)
+            return _combine_vectors(field, coefficients,
+                                    [vector for _, vector in pairs])
+
+        def exchange(values):
+            # Send the shares to all receivers.
+            pc = tuple(self.program_counter)
+            for peer_id in receivers:
+                if peer_id != self.id:
+                    self.protocols[peer_id].sendShares(pc, values)
+            # Receive and recombine shares if this player is a receiver.
+            if self.id in receivers:
+                vectors = []
+                for peer_id in self.players:
+                    if peer_id == self.id:
+                        d = Share(self, field, values)
+                    else:
+                        d = self._expect_shares(peer_id, field, quantity)
+                    d.addCallback(lambda v, x: (x, v),
+                                  field.scalar_field(peer_id))
+                    vectors.append(d)
+                result = ShareList(vectors, threshold+1)
+                result.addCallback(recombine)
+                return result
+
+        result = gather_shares(shares)
+        self.schedule_callback(result, exchange)
+
+        # do actual communication
+        self.activate_reactor()
+
+        if self.id in receivers:
+            return result
+
+    def precompute_recombination(self, field, threshold=None):
+        """Precompute the recombination vectors for *field*.
+
+        Vectors are computed for every set of *threshold* + 1
+        players, so that opening shares does not have to compute
+        them. The *threshold* defaults to :attr:`threshold`. See
+        :func:`viff.shamir.precompute`.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        shamir.precompute(field, self.num_players, threshold)
+
+    def _recombine(self, shares):
+        """Recombine a list of ``(player id, share)`` pairs.
+
+        This is used by :meth:`open` once enough shares have arrived.
+        """
+        return shamir.recombine(shares)
+
     @profile
     def add(self, share_a, share_b):
         """Addition of shares.
@@ -177,7 +312,10 @@ class PassiveRuntime(Runtime):
     def mul(self, share_a, share_b):
         """Multiplication of shares.
 
-        Communication cost: 1 Shamir sharing.
+        The product is reshared by the players in :attr:`resharers`
+        and the degree is reduced using their sharings.
+
+        Communication cost: 2t+1 Shamir sharings.
         """
         assert isinstance(share_a, Share), \
             "share_a must be a Share."
@@ -192,18 +330,33 @@ class PassiveRuntime(Runtime):
 
         # At this point both share_a and share_b must be Share
         # objects. So we wait on them, multiply and reshare.
+        self.check_resharers()
 
         def share_recombine(number):
-            shares = shamir.share(number, self.threshold, self.num_players)
+            field = number.field
+            pc = tuple(self.program_counter)
+
+            if self.id in self.resharers:
+                shares = shamir.share(number, self.threshold,
+                                      self.num_players)
+                for peer_id, share in shares:
+                    if peer_id.value == self.id:
+                        own_share = share
+                    else:
+                        self.protocols[peer_id.value].sendShare(pc, share)
 
             exchanged_shares = []
-            for peer_id, share in shares:
-                d = self._exchange_shares(peer_id.value, share)
-                d.addCallback(lambda share, peer_id: (peer_id, share), peer_id)
+            for peer_id in self.resharers:
+                if peer_id == self.id:
+                    d = Share(self, field, own_share)
+                else:
+                    d = self._expect_share(peer_id, field)
+                d.addCallback(lambda share, peer_id: (peer_id, share),
+                              field.scalar_field(peer_id))
                 exchanged_shares.append(d)
 
-            # Recombine the first 2t+1 shares.
-            result = gather_shares(exchanged_shares[:2*self.threshold+1])
+            # Recombine the shares from the resharers.
+            result = gather_shares(exchanged_shares)
             result.addCallback(shamir.recombine)
             return result
 
@@ -216,6 +369,69 @@ class PassiveRuntime(Runtime):
 
         return result
 
+    def mul_many(self, shares_a, shares_b):
+        """Multiply two lists of shares element-wise.
+
+        This does the same as multiplying the shares pair by pair,
+        but all products are reshared at once with
+        :func:`~viff.shamir.share_many` and each player sends all its
+        shares to each other player in a single message. Only the
+        players in :attr:`resharers` reshare their products, since
+        their sharings are enough to recombine the results.
+
+        Communication cost: 2t+1 messages of ``len(shares_a)``
+        elements to each player.
+        """
+        assert len(shares_a) == len(shares_b), \
+            "Lists of shares must have the same length."
+        quantity = len(shares_a)
+        if quantity == 0:
+            return []
+        self.check_resharers()
+        field = shares_a[0].field
+
+        def multiply(values):
+            return map(operator.mul, values[:quantity], values[quantity:])
+
+        def share_recombine(products):
+            resharers = self.resharers
+            pc = tuple(self.program_counter)
+
+            if self.id in resharers:
+                shares = shamir.share_many(products, self.threshold,
+                                           self.num_players, field)
+                for peer_id, vector in shares:
+                    if peer_id.value == self.id:
+                        own_vector = vector
+                    else:
+                        self.protocols[peer_id.value].sendShares(pc, vector)
+
+            vectors = []
+            for peer_id in resharers:
+                if peer_id == self.id:
+                    vectors.append(Share(self, field, own_vector))
+                else:
+                    vectors.append(self._expect_shares(peer_id, field,
+                                                       quantity))
+
+            xs = [field.scalar_field(peer_id) for peer_id in resharers]
+            coefficients = shamir.recombination_vector(xs)
+
+            result = gather_shares(vectors)
+            result.addCallback(lambda vectors:
+                                   _combine_vectors(field, coefficients,
+                                                    vectors))
+            return result
+
+        result = gather_shares(list(shares_a) + list(shares_b))
+        result.addCallback(multiply)
+        self.schedule_callback(result, share_recombine)
+
+        # do actual communication
+        self.activate_reactor()
+
+        return self._split_vector(result, field, quantity)
+
     def pow(self, share, exponent):
         """Exponentation of a share to an integer by square-and-multiply."""
 
@@ -237,7 +453,7 @@ class PassiveRuntime(Runtime):
                 share_b = field(share_b)
             share_b = Share(self, field, share_b)
 
-        if field is GF256:
+        if field.characteristic == 2:
             return share_a + share_b
         else:
             return share_a + share_b - 2 * share_a * share_b
@@ -331,25 +547,97 @@ class PassiveRuntime(Runtime):
         else:
             return result
 
+    def prss_share_many(self, inputters, field, elements=None,
+                        quantity=None):
+        """Creates many pseudo-random secret sharings at once.
+
+        This works like :meth:`prss_share`, except that each inputter
+        provides a list of *quantity* integers. Players who are not
+        inputters must give the *quantity*. The pseudo-random shares
+        are derived with one call to each PRF, and each inputter
+        sends all its correction values to each player in a single
+        message. The result is a list of lists of shares, one list for
+        each inputter.
+
+        Communication cost: Each inputter does one broadcast of
+        *quantity* elements.
+        """
+        # Verifying parameters.
+        if elements is None:
+            assert self.id not in inputters, "No elements given."
+        else:
+            assert self.id in inputters, \
+                "Elements given, but we are not sharing?"
+            if quantity is None:
+                quantity = len(elements)
+            assert len(elements) == quantity, "Wrong number of elements."
+        assert quantity is not None, "No quantity given."
+
+        n = self.num_players
+
+        # Key used for PRSS.
+        key = self.prss_key()
+        pc = tuple(self.program_counter)
+
+        prfs = self.players[self.id].dealer_prfs(field.modulus)
+
+        # Compute and broadcast the correction values.
+        if self.id in inputters:
+            shared = prss_secrets(field, prfs[self.id], key, quantity)
+            corrections = [field(e) - s for e, s in zip(elements, shared)]
+            for peer_id in self.players:
+                if peer_id != self.id:
+                    self.protocols[peer_id].sendShares(pc, corrections)
+
+        # Receive the correction values from the inputters and
+        # compute our shares.
+        result = []
+        for player in inputters:
+            shares = prss_multi(n, self.id, field, prfs[player], key,
+                                quantity)
+            if player == self.id:
+                d = Share(self, field, corrections)
+            else:
+                d = self._expect_shares(player, field, quantity)
+            d.addCallback(lambda c, s: map(operator.add, s, c), shares)
+            result.append(self._split_vector(d, field, quantity))
+
+        # do actual communication
+        self.activate_reactor()
+
+        # Unpack a singleton list.
+        if len(result) == 1:
+            return result[0]
+        else:
+            return result
+
     def prss_share_random(self, field, binary=False):
         """Generate shares of a uniformly random element from the field given.
 
         If binary is True, a 0/1 element is generated. No player
         learns the value of the element.
 
-        Communication cost: none if binary=False, 1 open otherwise.
+        For a :func:`~viff.field.PackedGF2` field a binary element is
+        a random bit vector.
+
+        Communication cost: none if binary=False or the field has
+        characteristic 2, 1 open otherwise.
         """
         if field is GF256 and binary:
             modulus = 2
+        elif field.characteristic == 2 and binary:
+            modulus = 2**field.width
         else:
             modulus = field.modulus
 
         # Key used for PRSS.
         prss_key = self.prss_key()
         prfs = self.players[self.id].prfs(modulus)
-        share = prss(self.num_players, self.id, field, prfs, prss_key)
+        share = self.prss_buffer.get(
+            (prss, field, modulus), prss_key,
+            lambda key: prss(self.num_players, self.id, field, prfs, key))
 
-        if field is GF256 or not binary:
+        if field.characteristic == 2 or not binary:
             return Share(self, field, share)
 
         # Open the square and compute a square-root
@@ -370,10 +658,80 @@ class PassiveRuntime(Runtime):
         self.schedule_callback(result, finish, share, binary)
         return result
 
+    def _split_vector(self, vector, field, quantity):
+        """Split a Deferred list of *quantity* field elements into a
+        list of shares."""
+        results = [Share(self, field) for _ in range(quantity)]
+
+        def split(values):
+            for share, value in zip(results, values):
+                share.callback(value)
+        vector.addCallback(split)
+        return results
+
+    def prss_share_random_bits(self, field, quantity):
+        """Generate shares of *quantity* uniformly random 0/1 elements.
+
+        This does the same as calling :meth:`prss_share_random` with
+        binary=True *quantity* times, but the squares of all the
+        random elements are opened together in one round. Only the
+        elements whose square turns out to be zero are generated
+        again.
+
+        Communication cost: 1 open of *quantity* elements, none if
+        the field has characteristic 2.
+        """
+        if field.characteristic == 2 or quantity == 0:
+            return [self.prss_share_random(field, binary=True)
+                    for _ in range(quantity)]
+
+        assert field.modulus % 4 == 3, \
+            "Cannot compute square roots with modulus %s" % field.modulus
+
+        prss_key = self.prss_key()
+        prfs = self.players[self.id].prfs(field.modulus)
+        shares = self.prss_buffer.get(
+            (prss_multi, field, field.modulus, quantity), prss_key,
+            lambda key: prss_multi(self.num_players, self.id, field, prfs,
+                                   key, quantity))
+
+        squares = self.open_many([Share(self, field, share * share)
+                                  for share in shares],
+                                 threshold=2*self.threshold)
+        results = [Share(self, field) for _ in range(quantity)]
+
+        def finish(squares):
+            half = ~field(2)
+            # Since the squares are quadratic residues, raising them
+            # to (p - 3)/4 gives the inverse of a square root directly.
+            exponent = (field.modulus - 3) // 4
+            retry = []
+            for i, square in enumerate(squares):
+                if square == 0:
+                    retry.append(i)
+                else:
+                    # Dividing by the root gives a -1/1 share, which
+                    # is converted into a 0/1 share.
+                    inverse_root = square**exponent
+                    results[i].callback((shares[i] * inverse_root + 1) * half)
+            if retry:
+                # We were unlucky, try again for the zero squares.
+                bits = self.prss_share_random_bits(field, len(retry))
+                for i, bit in zip(retry, bits):
+                    bit.chainDeferred(results[i])
+
+        self.schedule_callback(squares, finish)
+
+        # do actual communication
+        self.activate_reactor()
+
+        return results
+
     def prss_share_random_multi(self, field, quantity, binary=False):
         """Does the same as calling *quantity* times :meth:`prss_share_random`,
-        but with less calls to the PRF. Sampling of a binary element is only
-        possible if the field is :class:`GF256`.
+        but with one call to each PRF. Any *quantity* is supported.
+        Sampling of a binary element is only possible if the field is
+        :class:`GF256`.
 
         Communication cost: none.
         """
@@ -387,9 +745,11 @@ class PassiveRuntime(Runtime):
 
         # Key used for PRSS.
         prss_key = self.prss_key()
-        prfs = self.players[self.id].prfs(modulus ** quantity)
-        shares = prss_multi(self.num_players, self.id, field, prfs, prss_key,
-                            modulus, quantity)
+        prfs = self.players[self.id].prfs(modulus)
+        shares = self.prss_buffer.get(
+            (prss_multi, field, modulus, quantity), prss_key,
+            lambda key: prss_multi(self.num_players, self.id, field, prfs,
+                                   key, quantity))
         return [Share(self, field, share) for share in shares]
 
     def prss_share_zero(self, field, quantity):
@@ -401,8 +761,10 @@ class PassiveRuntime(Runtime):
         # Key used for PRSS.
         prss_key = self.prss_key()
         prfs = self.players[self.id].prfs(field.modulus)
-        zero_share = prss_zero(self.num_players, self.threshold, self.id,
-                               field, prfs, prss_key, quantity)
+        zero_share = self.prss_buffer.get(
+            (prss_zero, field, quantity), prss_key,
+            lambda key: prss_zero(self.num_players, self.threshold, self.id,
+                                  field, prfs, key, quantity))
         return [Share(self, field, zero_share[i]) for i in range(quantity)]
 
     def prss_double_share(self, field, quantity):
@@ -481,7 +843,6 @@ class PassiveRuntime(Runtime):
     def prss_powerchains(self, max=7, quantity=20):
         """Does *quantity* times the same as :meth:`prss_powerchain`.
         Used for preprocessing."""
-        quantity = min(quantity, 20)
         shares = self.prss_share_random_multi(GF256, quantity)
         return [gatherResults(self.powerchain(share, max)) for share in shares]
 
@@ -557,3 +918,62 @@ class PassiveRuntime(Runtime):
             return results[0]
         else:
             return results
+
+    def shamir_share_vector(self, inputters, field, numbers=None,
+                            quantity=None, threshold=None):
+        """Secret share a list of *numbers* over *field* using
+        Shamir's method.
+
+        This works like :meth:`shamir_share`, except that each
+        inputter provides a list of *quantity* numbers. Players who
+        are not inputters must give the *quantity*. All the numbers of
+        an inputter are shared with one program counter and each
+        player receives its shares in a single message. Returns a
+        list of lists of shares, one list for each inputter, unless
+        there is only one inputter in which case its list is returned
+        directly::
+
+            if runtime.id == 1:
+                xs = runtime.shamir_share_vector([1], Zp, [3, 1, 4, 1])
+            else:
+                xs = runtime.shamir_share_vector([1], Zp, quantity=4)
+
+        Communication cost: n messages of *quantity* elements per
+        inputter.
+        """
+        if numbers is not None:
+            assert self.id in inputters
+            if quantity is None:
+                quantity = len(numbers)
+            assert len(numbers) == quantity, "Wrong number of numbers."
+        assert quantity is not None, "No quantity given."
+        if threshold is None:
+            threshold = self.threshold
+
+        results = []
+        for peer_id in inputters:
+            # Unique program counter per inputter.
+            self.increment_pc()
+
+            if peer_id == self.id:
+                pc = tuple(self.program_counter)
+                shares = shamir.share_many([field(n) for n in numbers],
+                                           threshold, self.num_players, field)
+                for other_id, vector in shares:
+                    if other_id.value == self.id:
+                        results.append([Share(self, field, s)
+                                        for s in vector])
+                    else:
+                        self.protocols[other_id.value].sendShares(pc, vector)
+            else:
+                vector = self._expect_shares(peer_id, field, quantity)
+                results.append(self._split_vector(vector, field, quantity))
+
+        # do actual communication
+        self.activate_reactor()
+
+        # Unpack a singleton list.
+        if len(results) == 1:
+            return results[0]
+        else:
+            return results
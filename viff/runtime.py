@@ -32,7 +32,6 @@ scheduling things correctly behind the scenes.
 from __future__ import division
 
 import time
-import struct
 from optparse import OptionParser, OptionGroup
 from collections import deque
 import os
@@ -40,7 +39,8 @@ import sys
 
 from viff.field import GF256, FieldElement
 from viff.util import wrapper, rand, track_memory_usage, begin, end
-from viff.constants import SHARE
+from viff.constants import SHARE, SHARES
+from viff.exchange import MessageExchanger, unpack_shares, shares_per_packet
 import viff.reactor
 
 from twisted.internet import reactor
@@ -48,6 +48,7 @@ from twisted.internet.task import LoopingCall
 from twisted.internet.error import ConnectionDone, CannotListenError
 from twisted.internet.defer import Deferred, DeferredList, gatherResults
 from twisted.internet.defer import maybeDeferred
+from twisted.internet.threads import deferToThread
 from twisted.internet.protocol import ReconnectingClientFactory, ServerFactory
 from twisted.protocols.basic import Int16StringReceiver
 
@@ -267,23 +268,19 @@ def gather_shares(shares):
     return share_list
 
 
-class ShareExchanger(Int16StringReceiver):
+class ShareExchanger(MessageExchanger, Int16StringReceiver):
     """Send and receive shares.
 
     All players are connected by pair-wise connections and this
     Twisted protocol is one such connection. It is used to send and
-    receive shares from one other player.
+    receive shares from one other player. The frames are sent as
+    Int16 prefixed strings, everything else is handled by
+    :class:`viff.exchange.MessageExchanger`.
     """
 
     def __init__(self):
-        self.peer_id = None
+        MessageExchanger.__init__(self)
         self.lost_connection = Deferred()
-        #: Data expected to be received in the future.
-        self.incoming_data = {}
-        self.waiting_deferreds = {}
-        #: Statistics
-        self.sent_packets = 0
-        self.sent_bytes = 0
 
     def connectionMade(self):
         self.sendString(str(self.factory.runtime.id))
@@ -295,9 +292,8 @@ class ShareExchanger(Int16StringReceiver):
     def stringReceived(self, string):
         """Called when a share is received.
 
-        The string received is unpacked into the program counter, and
-        a data part. The data is passed the appropriate Deferred in
-        :class:`self.incoming_data`.
+        The first string identifies the peer, the following strings
+        are frames which are passed to :meth:`frame_received`.
         """
         if self.peer_id is None:
             # TODO: Handle ValueError if the string cannot be decoded.
@@ -316,60 +312,19 @@ class ShareExchanger(Int16StringReceiver):
                     self.transport.loseConnection()
             self.factory.identify_peer(self)
         else:
-            try:
-                pc_size, data_size, data_type = struct.unpack("!HHB", string[:5])
-                fmt = "!%dI%ds" % (pc_size, data_size)
-                unpacked = struct.unpack(fmt, string[5:])
-
-                program_counter = unpacked[:pc_size]
-                data = unpacked[-1]
-
-                key = (program_counter, data_type)
-
-                if key in self.waiting_deferreds:
-                    deq = self.waiting_deferreds[key]
-                    deferred = deq.popleft()
-                    if not deq:
-                        del self.waiting_deferreds[key]
-                    self.factory.runtime.handle_deferred_data(deferred, data)
-                else:
-                    deq = self.incoming_data.setdefault(key, deque())
-                    deq.append(data)
-            except struct.error, e:
-                self.factory.runtime.abort(self, e)
+            self.frame_received(string)
 
-    def sendData(self, program_counter, data_type, data):
-        """Send data to the peer.
+    def send_frame(self, frame):
+        """Send a frame as an Int16 prefixed string."""
+        self.sendString(frame)
 
-        The *program_counter* is a tuple of unsigned integers, the
-        *data_type* is an unsigned byte and *data* is a string.
+    def frame_error(self, error):
+        """Abort the runtime when a malformed frame is received."""
+        self.factory.runtime.abort(self, error)
 
-        The data is encoded as follows::
-
-          +---------+-----------+-----------+--------+--------------+
-          | pc_size | data_size | data_type |   pc   |     data     |
-          +---------+-----------+-----------+--------+--------------+
-            2 bytes   2 bytes      1 byte     varies      varies
-
-        The program counter takes up ``4 * pc_size`` bytes, the data
-        takes up ``data_size`` bytes.
-        """
-        pc_size = len(program_counter)
-        data_size = len(data)
-        fmt = "!HHB%dI%ds" % (pc_size, data_size)
-        t = (pc_size, data_size, data_type) + program_counter + (data,)
-        packet = struct.pack(fmt, *t)
-        self.sendString(packet)
-        self.sent_packets += 1
-        self.sent_bytes += len(packet)
-
-    def sendShare(self, program_counter, share):
-        """Send a share.
-
-        The program counter and the share are converted to bytes and
-        sent to the peer.
-        """
-        self.sendData(program_counter, SHARE, hex(share.value))
+    def data_ready(self, deferred, data):
+        """Let the runtime decide when to trigger the *deferred*."""
+        self.factory.runtime.handle_deferred_data(deferred, data)
 
     def loseConnection(self):
         """Disconnect this protocol instance."""
@@ -385,24 +340,10 @@ class SelfShareExchanger(ShareExchanger):
     def stringReceived(self, program_counter, data_type, data):
         """Called when a share is received.
 
-        The string received is unpacked into the program counter, and
-        a data part. The data is passed the appropriate Deferred in
+        The data is passed the appropriate Deferred in
         :class:`self.incoming_data`.
         """
-        try:
-            key = (program_counter, data_type)
-                         
-            if key in self.waiting_deferreds:
-                deq = self.waiting_deferreds[key]
-                deferred = deq.popleft()
-                if not deq:
-                    del self.waiting_deferreds[key]
-                self.factory.runtime.handle_deferred_data(deferred, data)
-            else:
-                deq = self.incoming_data.setdefault(key, deque())
-                deq.append(data)
-        except struct.error, e:
-            self.factory.runtime.abort(self, e)
+        self.deliver_data(program_counter, data_type, data)
 
     def sendData(self, program_counter, data_type, data):
         """Send data to the self.id."""
@@ -541,6 +482,26 @@ class Runtime:
                          "computation. All IDs for runs using the same set "
                          "of player configuration files must be unique "
                          "to ensure security.")
+        group.add_option("--workers", type="int", metavar="N",
+                         help="Number of worker processes used for heavy "
+                         "local computations such as Paillier encryption. "
+                         "Zero disables the worker pool.")
+        group.add_option("--packing", type="int", metavar="K",
+                         help="Number of secrets stored in each sharing "
+                         "with the packed Shamir runtime.")
+        group.add_option("--resharers", metavar="IDS",
+                         help="Comma-separated IDs of the 2t+1 players "
+                         "whose reshared products are used when "
+                         "multiplying. Slow players can be left out. "
+                         "The default is players 1 to 2t+1.")
+        group.add_option("--prss-buffer", type="int", metavar="DEPTH",
+                         help="Number of upcoming program counters for "
+                         "which PRSS values are computed ahead of time. "
+                         "Zero disables the buffer.")
+        group.add_option("--ntt", action="store_true",
+                         help="Use number-theoretic transforms for "
+                         "hyper-invertible matrices when the field "
+                         "allows it.")
 
         try:
             # Using __import__ since we do not use the module, we are
@@ -557,7 +518,12 @@ class Runtime:
                             profile=False,
                             track_memory=False,
                             statistics=False,
-                            computation_id=None)
+                            computation_id=None,
+                            workers=0,
+                            packing=2,
+                            prss_buffer=0,
+                            resharers=None,
+                            ntt=False)
 
     def __init__(self, player, threshold, options=None):
         """Initialize runtime.
@@ -633,6 +599,17 @@ class Runtime:
         #: Use deferred queues only if the ViffReactor is running.
         self.using_viff_reactor = isinstance(reactor, viff.reactor.ViffReactor)
 
+        #: Pool of worker processes, see :meth:`offload`.
+        self.workers = None
+        self.num_workers = 0
+        if self.options.workers:
+            self.start_workers(self.options.workers)
+
+        #: Buffer of PRSS values computed ahead of time, if any, see
+        #: :class:`~viff.prss.PRSSBuffer`. It is stopped on
+        #: :meth:`shutdown`.
+        self.prss_buffer = None
+
     def add_player(self, player, protocol):
         self.players[player.id] = player
         self.num_players = len(self.players)
@@ -657,6 +634,9 @@ class Runtime:
 
         def stop_reactor(_):
             print "done."
+            self.stop_workers()
+            if self.prss_buffer is not None:
+                self.prss_buffer.stop()
             print "Stopping reactor...",
             reactor.stop()
             print "done."
@@ -750,6 +730,66 @@ class Runtime:
         deferred.addCallback(queue_callback, self, fork)
         return self.schedule_callback(fork, func, *args, **kwargs)
 
+    def call_soon(self, func):
+        """Call *func* when the reactor has handled the pending events.
+
+        Returns an object with a ``cancel`` method for cancelling the
+        call. This is used for scheduling background work such as
+        filling the PRSS buffer.
+        """
+        return reactor.callLater(0, func)
+
+    def start_workers(self, count):
+        """Start a pool of *count* worker processes.
+
+        The pool is used by :meth:`offload` and :meth:`offload_many`.
+        Starting the workers before connecting to the other players
+        keeps the forked processes free of open sockets.
+        """
+        from multiprocessing import Pool
+        self.stop_workers()
+        self.workers = Pool(count)
+        self.num_workers = count
+
+    def stop_workers(self):
+        """Terminate the worker pool, if any."""
+        if self.workers is not None:
+            self.workers.close()
+            self.workers.join()
+            self.workers = None
+            self.num_workers = 0
+
+    def offload(self, func, *args):
+        """Evaluate ``func(*args)`` in a worker process.
+
+        Returns a :class:`Deferred` which will trigger with the
+        result. The function and its arguments must be picklable,
+        which means that *func* must be defined at the top level of a
+        module. Without a worker pool the function is simply called
+        right away.
+        """
+        result = self.offload_many(func, [args])
+        result.addCallback(lambda results: results[0])
+        return result
+
+    def offload_many(self, func, args_list):
+        """Evaluate *func* once for each tuple in *args_list*.
+
+        The calls are shipped to the worker pool in batches and the
+        returned :class:`Deferred` triggers with the list of results
+        in the same order as *args_list*. This lets CPU-bound local
+        computations (Paillier encryptions, decryptions, ...) use
+        every core of the machine.
+        """
+        jobs = [(func, tuple(args)) for args in args_list]
+        if self.workers is None or not jobs:
+            return maybeDeferred(map, _apply, jobs)
+
+        # Pool.map blocks until all results are ready, so we wait for
+        # it in a thread to keep the reactor running.
+        chunksize = max(1, len(jobs) // (4 * self.num_workers))
+        return deferToThread(self.workers.map, _apply, jobs, chunksize)
+
     def synchronize(self):
         """Introduce a synchronization point.
 
@@ -772,19 +812,7 @@ class Runtime:
         return self._expect_data_with_pc(pc, peer_id, data_type, deferred)
 
     def _expect_data_with_pc(self, pc, peer_id, data_type, deferred):
-        key = (pc, data_type)
-
-        if key in self.protocols[peer_id].incoming_data:
-            # We have already received some data from the other side.
-            deq = self.protocols[peer_id].incoming_data[key]
-            data = deq.popleft()
-            if not deq:
-                del self.protocols[peer_id].incoming_data[key]
-            deferred.callback(data)
-        else:
-            # We have not yet received anything from the other side.
-            deq = self.protocols[peer_id].waiting_deferreds.setdefault(key, deque())
-            deq.append(deferred)
+        self.protocols[peer_id].expect_data(pc, data_type, deferred)
 
     def _exchange_shares(self, peer_id, field_element):
         """Exchange shares with another player.
@@ -808,6 +836,26 @@ class Runtime:
         self._expect_data(peer_id, SHARE, share)
         return share
 
+    def _expect_shares(self, peer_id, field, count):
+        """Expect a list of *count* shares sent with
+        :meth:`ShareExchanger.sendShares`.
+
+        Returns a :class:`Share` whose value is the list of field
+        elements.
+        """
+        pc = tuple(self.program_counter)
+        step = shares_per_packet(pc, field)
+        packets = []
+        for i in range(0, count, step):
+            d = Deferred()
+            self._expect_data_with_pc(pc, peer_id, SHARES, d)
+            packets.append(d)
+        result = Share(self, field)
+        data = gatherResults(packets)
+        data.addCallback(lambda data: unpack_shares(field, "".join(data)))
+        data.chainDeferred(result)
+        return result
+
     def preprocess(self, program):
         """Generate preprocess material.
 
@@ -950,6 +998,16 @@ class Runtime:
                   (protocol.peer_id, protocol.sent_bytes, protocol.sent_packets)
 
 
+def _apply(job):
+    """Call ``func(*args)`` for a ``(func, args)`` pair.
+
+    This is used by :meth:`Runtime.offload_many` and must be defined
+    at the module level so that it can be sent to worker processes.
+    """
+    func, args = job
+    return func(*args)
+
+
 def make_runtime_class(runtime_class=None, mixins=None):
     """Creates a new runtime class with *runtime_class* as a base
     class mixing in the *mixins*. By default
@@ -21,10 +21,13 @@ share a secret* by Adi Shamir in *Communications of the ACM* **22**
 """
 
 import operator
-from viff.util import rand, fake
 
+from viff.field import batch_invert
+from viff.util import rand, fake, OrderedDict, combinations
+from viff.vector import FieldVector
 
-@fake(lambda s, t, n: [(s.field(i+1), s) for i in range(n)])
+
+@fake(lambda s, t, n: [(s.field.scalar_field(i+1), s) for i in range(n)])
 def share(secret, threshold, num_players):
     """Shamir share secret.
 
@@ -51,15 +54,27 @@ def share(secret, threshold, num_players):
     Traceback (most recent call last):
       ...
     AssertionError: Threshold out of range
+
+    The *secret* can also be a :class:`viff.vector.FieldVector`. The
+    elements are then shared using independent polynomials and each
+    share is a vector.
+
+    The player ids are elements of the :attr:`scalar_field` of the
+    field, which is the field itself except for packed fields such as
+    :func:`viff.field.PackedGF2`.
     """
     assert threshold >= 0 and threshold < num_players, "Threshold out of range"
 
     coef = [secret]
     for j in range(threshold):
-        # TODO: introduce a random() method in FieldElements so that
-        # this wont have to be a long when we are sharing a
-        # GMPIntegerFieldElement.
-        coef.append(rand.randint(0, long(secret.modulus)-1))
+        if isinstance(secret, FieldVector):
+            coef.append(FieldVector.random(secret.field, len(secret)))
+        else:
+            # TODO: introduce a random() method in FieldElements so
+            # that this wont have to be a long when we are sharing a
+            # GMPIntegerFieldElement.
+            coef.append(secret.field(rand.randint(0,
+                                                  long(secret.modulus)-1)))
 
     shares = []
     for i in range(1, num_players+1):
@@ -72,7 +87,7 @@ def share(secret, threshold, num_players):
         #   s_i = s + x_i (a_1 + x_i (a_2 + x_i ( ... (a_t) ... )))
         #
         # This is a little faster, even for small n and t.
-        cur_point = secret.field(i)
+        cur_point = secret.field.scalar_field(i)
         cur_share = coef[threshold]
         # Go backwards from threshold-1 down to 0
         for j in range(threshold-1, -1, -1):
@@ -82,12 +97,178 @@ def share(secret, threshold, num_players):
 
     return shares
 
-#: Cached recombination vectors.
+#: Cached powers of the player ids.
 #:
-#: The recombination vector used by `recombine` depends only on the
-#: recombination point and the player IDs of the shares, and so it can
-#: be cached for efficiency.
-_recombination_vectors = {}
+#: The rows of the Vandermonde matrix used by `share_many` depend
+#: only on the field, the threshold, and the number of players.
+_vandermonde_rows = {}
+
+
+@fake(lambda ss, t, n, field=None:
+      [((field or ss[0].field).scalar_field(i+1), list(ss))
+       for i in range(n)])
+def share_many(secrets, threshold, num_players, field=None):
+    """Shamir share a list of secrets.
+
+    Each secret is shared with an independent random polynomial, just
+    like with :func:`share`. The return value is a list of ``(player
+    id, shares)`` pairs, one per player, where *shares* is the list of
+    shares for that player, one share per secret:
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> shares = share_many([Zp(10), Zp(20)], 1, 3)
+    >>> [player_id for player_id, _ in shares]
+    [{1}, {2}, {3}]
+    >>> recombine([(x, s[1]) for x, s in shares[1:]])
+    {20}
+
+    For prime fields the shares are computed using cached powers of
+    the player ids and integer arithmetic with a single modular
+    reduction per share. For fields of characteristic 2 the secrets
+    are shared one by one:
+
+    >>> from field import GF256
+    >>> shares = share_many([GF256(10), GF256(20)], 2, 4)
+    >>> recombine([(x, s[0]) for x, s in shares[:3]])
+    [10]
+
+    The *secrets* can also be a :class:`viff.vector.FieldVector`, in
+    which case the shares of each player is a vector too.
+
+    The *field* of the secrets is only needed when *secrets* might be
+    empty, so that the player ids can still be field elements:
+
+    >>> share_many([], 1, 3, Zp)
+    [({1}, []), ({2}, []), ({3}, [])]
+    """
+    assert threshold >= 0 and threshold < num_players, "Threshold out of range"
+    if isinstance(secrets, FieldVector):
+        return share(secrets, threshold, num_players)
+
+    if field is None:
+        assert secrets, "The field must be given for an empty list of secrets"
+        field = secrets[0].field
+
+    if not secrets:
+        return [(field.scalar_field(i), []) for i in range(1, num_players+1)]
+
+    if field.characteristic == 2:
+        all_shares = [share(secret, threshold, num_players)
+                      for secret in secrets]
+        return [(player_shares[0][0], [s for _, s in player_shares])
+                for player_shares in zip(*all_shares)]
+
+    key = (field, threshold, num_players)
+    try:
+        rows = _vandermonde_rows[key]
+    except KeyError:
+        # The values of the field elements are used so that we get
+        # gmpy integers for large fields.
+        rows = [[(field(i)**j).value for j in range(1, threshold+1)]
+                for i in range(1, num_players+1)]
+        _vandermonde_rows[key] = rows
+
+    modulus = long(field.modulus)
+    values = [secret.value for secret in secrets]
+    coefs = [[rand.randint(0, modulus-1) for _ in range(threshold)]
+             for _ in secrets]
+
+    result = []
+    for i, row in enumerate(rows):
+        shares = [field(value + sum(map(operator.mul, coef, row)))
+                  for value, coef in zip(values, coefs)]
+        result.append((field(i+1), shares))
+    return result
+
+#: Maximum number of recombination vectors cached per field.
+CACHE_SIZE = 10000
+
+
+class RecombinationCache(object):
+    """Cache of recombination vectors for a single field.
+
+    The recombination vector used by :func:`recombine` depends only
+    on the recombination point and the player IDs of the shares, and
+    so it can be cached for efficiency. The cache also holds the
+    matrices made by :func:`parity_check_matrix`. The cache holds at most
+    *size* vectors and evicts the least recently used vector when it
+    is full.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        """Create an empty cache holding at most *size* vectors."""
+        self.size = size
+        self.vectors = OrderedDict()
+        #: Number of lookups which found a cached vector.
+        self.hits = 0
+        #: Number of lookups which had to compute the vector.
+        self.misses = 0
+
+    def __len__(self):
+        """Number of cached vectors."""
+        return len(self.vectors)
+
+    def get(self, key):
+        """Return the vector for *key* or ``None`` if not cached."""
+        try:
+            vector = self.vectors.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # Reinsert the vector to mark it as most recently used.
+        self.vectors[key] = vector
+        self.hits += 1
+        return vector
+
+    def put(self, key, vector):
+        """Store *vector* under *key*."""
+        self.vectors[key] = vector
+        if len(self.vectors) > self.size:
+            self.vectors.popitem(last=False)
+
+
+#: Recombination caches, indexed by field.
+_recombination_caches = {}
+
+def recombination_cache(field):
+    """Return the :class:`RecombinationCache` used for *field*.
+
+    >>> from field import GF
+    >>> Zp = GF(19)
+    >>> cache = recombination_cache(Zp)
+    >>> hits = cache.hits
+    >>> _ = recombine([(Zp(1), Zp(5)), (Zp(2), Zp(6))])
+    >>> _ = recombine([(Zp(1), Zp(5)), (Zp(2), Zp(6))])
+    >>> cache.hits - hits
+    1
+    """
+    try:
+        return _recombination_caches[field]
+    except KeyError:
+        cache = _recombination_caches[field] = RecombinationCache()
+        return cache
+
+
+def precompute(field, num_players, threshold, x_recomb=0):
+    """Compute recombination vectors for all sets of player IDs.
+
+    The vectors for every set of *threshold* + 1 player IDs (sorted
+    in increasing order, as they are used by the runtimes) are stored
+    in the cache for *field*. This avoids computing them when shares
+    are recombined later. The number of sets grows quickly with the
+    number of players and only the last :data:`CACHE_SIZE` vectors
+    will be kept.
+
+    >>> from field import GF
+    >>> Zp = GF(10007)
+    >>> precompute(Zp, 5, 2)
+    >>> len(recombination_cache(Zp))
+    10
+    """
+    points = [field.scalar_field(i) for i in range(1, num_players+1)]
+    for xs in combinations(points, threshold+1):
+        recombination_vector(xs, x_recomb)
 
 
 @fake(lambda s, x=0: s[0][1])
@@ -108,21 +289,139 @@ def recombine(shares, x_recomb=0):
     >>> del(shares[1])
     >>> recombine(shares)
     {3}
+
+    The shares can also be :class:`viff.vector.FieldVector` instances
+    holding a share of each element, in which case a vector is
+    returned.
     """
     xs, ys = zip(*shares)
-    key = xs + (x_recomb, )
-    try:
-        vector = _recombination_vectors[key]
-    except KeyError:
-        vector = []
-        for i, x_i in enumerate(xs):
-            factors = [(x_k - x_recomb) / (x_k - x_i)
-                       for k, x_k in enumerate(xs) if k != i]
-            vector.append(reduce(operator.mul, factors))
-        _recombination_vectors[key] = vector
+    vector = recombination_vector(xs, x_recomb)
     return sum(map(operator.mul, ys, vector))
 
 
+def recombination_vector(xs, x_recomb=0):
+    """Return the Lagrange coefficients for the points *xs*.
+
+    The coefficients are for interpolation in *x_recomb*: the value
+    of a polynomial of degree less than ``len(xs)`` in *x_recomb* is
+    the inner product of its values in *xs* with the coefficients.
+
+    >>> from field import GF
+    >>> Zp = GF(19)
+    >>> recombination_vector((Zp(1), Zp(2)))
+    [{2}, {18}]
+    """
+    key = tuple(xs) + (x_recomb, )
+    cache = recombination_cache(getattr(xs[0], "field", None))
+    vector = cache.get(key)
+    if vector is None:
+        # The numerator for x_i is the product of all the differences
+        # x_k - x_recomb except the i'th one. We find them using
+        # products of prefixes and suffixes of the differences.
+        diffs = [x_k - x_recomb for x_k in xs]
+        prefixes = [1]
+        for diff in diffs[:-1]:
+            prefixes.append(prefixes[-1] * diff)
+        numerators = [None] * len(xs)
+        suffix = 1
+        for i in range(len(xs) - 1, -1, -1):
+            numerators[i] = prefixes[i] * suffix
+            suffix = suffix * diffs[i]
+
+        denominators = []
+        for i, x_i in enumerate(xs):
+            denominators.append(reduce(operator.mul,
+                                       [x_k - x_i for k, x_k in enumerate(xs)
+                                        if k != i]))
+        # All denominators are inverted at once.
+        vector = map(operator.mul, numerators, batch_invert(denominators))
+        cache.put(key, vector)
+    return vector
+
+
+def share_packed(secrets, threshold, num_players):
+    """Packed Shamir share of several secrets.
+
+    The *k* secrets are stored in a single polynomial of degree
+    *threshold* + *k* - 1, as described by Franklin and Yung in
+    *Communication complexity of secure computation*. Secret number
+    *l* is the value of the polynomial in the point -*l*, and the
+    polynomial is random in *threshold* further points. The return
+    value is a list of ``(player id, share)`` pairs.
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> shares = share_packed([Zp(10), Zp(20)], 1, 5)
+    >>> recombine_packed(shares[2:], 2)
+    [{10}, {20}]
+    """
+    k = len(secrets)
+    degree = threshold + k - 1
+    assert threshold >= 0 and degree < num_players, "Threshold out of range"
+
+    field = secrets[0].field
+    xs = [field(-l) for l in range(1, degree + 2)]
+    ys = list(secrets)
+    for _ in range(threshold):
+        ys.append(field(rand.randint(0, long(field.modulus)-1)))
+
+    shares = []
+    for i in range(1, num_players+1):
+        point = field(i)
+        vector = recombination_vector(xs, point)
+        shares.append((point, sum(map(operator.mul, ys, vector))))
+    return shares
+
+
+def recombine_packed(shares, count):
+    """Recombine *count* secrets from a packed sharing.
+
+    Shares is a list of ``(player id, share)`` pairs, which must have
+    at least as many pairs as the degree of the sharing plus one. See
+    :func:`share_packed`.
+    """
+    field = shares[0][0].field
+    return [recombine(shares, field(-l)) for l in range(1, count+1)]
+
+
+def parity_check_matrix(xs, degree):
+    """Return a parity-check matrix for sharings of *degree*.
+
+    The matrix has a row for each point in *xs* beyond the first
+    *degree* + 1. A list of shares in the points *xs* lies on a
+    polynomial of at most the given degree exactly when the inner
+    product of each row with the shares is zero. The rows are
+    ``v_i * x_i**j`` where ``v_i`` is the inverse of the product of
+    ``x_i - x_k`` for all *k* different from *i*.
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> parity_check_matrix((Zp(1), Zp(2), Zp(3)), 1)
+    [[{24}, {46}, {24}]]
+
+    The matrices are stored in the :class:`RecombinationCache` of
+    the field. Callers should give the points in a fixed order, such
+    as increasing order, so that each set of points is only stored
+    once.
+    """
+    key = ("parity", tuple(xs), degree)
+    cache = recombination_cache(getattr(xs[0], "field", None))
+    matrix = cache.get(key)
+    if matrix is None:
+        denominators = []
+        for i, x_i in enumerate(xs):
+            denominators.append(reduce(operator.mul,
+                                       [x_i - x_k for k, x_k in enumerate(xs)
+                                        if k != i]))
+        row = batch_invert(denominators)
+        matrix = []
+        for _ in range(len(xs) - degree - 1):
+            matrix.append(row)
+            row = map(operator.mul, row, xs)
+        cache.put(key, matrix)
+    return matrix
+
+
 def verify_sharing(shares, degree):
     """Verifies that a sharing is correct.
 
@@ -138,15 +437,158 @@ def verify_sharing(shares, degree):
     True
     >>> verify_sharing(shares, 1)
     False
+
+    The check is done with a cached :func:`parity_check_matrix`. The
+    shares are sorted by player id first, so the order in which they
+    are given does not matter.
     """
-    used_shares = shares[0:degree+1]
-    for i in range(degree+1, len(shares)+1):
-        if recombine(used_shares, i) != shares[i-1][1]:
+    xs, ys = zip(*sorted(shares, key=lambda (x, _): x.value))
+    for row in parity_check_matrix(xs, degree):
+        if sum(map(operator.mul, row, ys)) != 0:
             return False
-
     return True
 
 
+def verify_sharings(sharings, degree):
+    """Verifies that many sharings are correct.
+
+    The *sharings* is a list of sharings, each a list of ``(player
+    id, share)`` pairs with the same player ids. Instead of checking
+    each sharing, a random linear combination of them is checked with
+    a single call to :func:`verify_sharing`:
+
+    >>> from field import GF
+    >>> Zp = GF(1031)
+    >>> good = [(Zp(i), Zp(i**2)) for i in range(1, 6)]
+    >>> bad = [(Zp(i), Zp(i**3)) for i in range(1, 6)]
+    >>> verify_sharings([good, good], 2)
+    True
+    >>> verify_sharings([good, bad], 2)
+    False
+
+    If a sharing is incorrect, the combination is incorrect except
+    with probability at most one over the size of the field minus one.
+    """
+    assert sharings, "At least one sharing is needed"
+    sharings = [sorted(sharing, key=lambda (x, _): x.value)
+                for sharing in sharings]
+    xs = [x for x, _ in sharings[0]]
+    field = sharings[0][0][1].field
+    combined = [field(0)] * len(xs)
+    for sharing in sharings:
+        assert [x for x, _ in sharing] == xs, \
+            "Sharings must have the same player ids"
+        r = field(rand.randint(1, long(field.modulus)-1))
+        combined = [c + r * y for c, (_, y) in zip(combined, sharing)]
+    return verify_sharing(zip(xs, combined), degree)
+
+
+def _solve(rows, rhs):
+    """Solve a linear system by Gaussian elimination.
+
+    Returns a solution to the system given by the coefficients in
+    *rows* and the right-hand side *rhs*, or None if there is no
+    solution. Free variables are set to zero.
+    """
+    field = rhs[0].field
+    rows = [row + [b] for row, b in zip(rows, rhs)]
+    width = len(rows[0]) - 1
+    pivots = []
+    for column in range(width):
+        r = len(pivots)
+        for i in range(r, len(rows)):
+            if rows[i][column] != 0:
+                break
+        else:
+            continue
+        rows[r], rows[i] = rows[i], rows[r]
+        inverse = ~rows[r][column]
+        rows[r] = [v * inverse for v in rows[r]]
+        for i, row in enumerate(rows):
+            if i != r and row[column] != 0:
+                factor = row[column]
+                rows[i] = [a - factor * b for a, b in zip(row, rows[r])]
+        pivots.append(column)
+        if len(pivots) == len(rows):
+            break
+    for row in rows[len(pivots):]:
+        if row[-1] != 0:
+            return None
+    solution = [field(0)] * width
+    for row, column in zip(rows, pivots):
+        solution[column] = row[-1]
+    return solution
+
+
+def _evaluate(coefficients, x):
+    """Evaluate a polynomial given by its coefficients in *x*."""
+    result = coefficients[-1]
+    for c in reversed(coefficients[:-1]):
+        result = result * x + c
+    return result
+
+
+def decode(shares, degree, errors=None):
+    """Recombine a sharing where some shares may be wrong.
+
+    The *shares* is a list of ``(player id, share)`` pairs. Up to
+    *errors* wrong shares are corrected using the Berlekamp-Welch
+    algorithm. This requires at least *degree* + 2 * *errors* + 1
+    shares. By default, *errors* is as large as the number of shares
+    allows.
+
+    The result is a pair with the secret and a list of the player
+    ids whose shares were wrong, or None if no polynomial of the
+    given degree agrees with all but *errors* of the shares:
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> shares = [(Zp(i), 3 * Zp(i) + 7) for i in range(1, 5)]
+    >>> shares[1] = (Zp(2), Zp(0))
+    >>> decode(shares, 1)
+    ({7}, [{2}])
+    >>> shares[2] = (Zp(3), Zp(0))
+    >>> print decode(shares, 1)
+    None
+    """
+    if errors is None:
+        errors = (len(shares) - degree - 1) // 2
+    assert len(shares) > degree + 2 * errors, "Too few shares"
+
+    # Find an error locator polynomial E of degree errors with
+    # leading coefficient one and a polynomial Q with Q(x) = y * E(x)
+    # for every share. The polynomial of the sharing is then Q / E.
+    rows = []
+    rhs = []
+    for x, y in shares:
+        powers = [y.field(1)]
+        for _ in range(degree + errors):
+            powers.append(powers[-1] * x)
+        rows.append(powers + [-y * p for p in powers[:errors]])
+        rhs.append(y * powers[errors])
+    solution = _solve(rows, rhs)
+    if solution is None:
+        return None
+
+    # Divide Q by E.
+    remainder = solution[:degree+errors+1]
+    locator = solution[degree+errors+1:]
+    quotient = []
+    for i in range(degree, -1, -1):
+        c = remainder.pop()
+        quotient.append(c)
+        for j, e in enumerate(locator):
+            remainder[i+j] -= c * e
+    if [r for r in remainder if r != 0]:
+        return None
+    quotient.reverse()
+
+    wrong = [x for x, y in shares if _evaluate(quotient, x) != y]
+    if len(wrong) > errors:
+        return None
+    return quotient[0], wrong
+
+
 if __name__ == "__main__":
     import doctest    #pragma NO COVER
     doctest.testmod() #pragma NO COVER
@@ -19,7 +19,10 @@ import operator
 
 from twisted.internet.defer import gatherResults
 
+from viff import shamir
 from viff.test.util import RuntimeTestCase, protocol, BinaryOperatorTestCase
+from viff.field import GF
+from viff.util import find_prime
 from viff.runtime import Share
 from viff.active import BasicActiveRuntime, ActiveRuntime, \
     BrachaBroadcastMixin, TriplesHyperinvertibleMatricesMixin
@@ -28,6 +31,84 @@ class MulTest(BinaryOperatorTestCase, RuntimeTestCase):
     operator = operator.mul
     runtime_class = ActiveRuntime
 
+class RobustOpenTest(RuntimeTestCase):
+    """Test for opening with error correction."""
+
+    #: Number of players.
+    #:
+    #: Correcting t errors needs n > 3t+1, so with the default
+    #: threshold of t=1, we need n=4.
+    num_players = 4
+
+    runtime_class = ActiveRuntime
+
+    @protocol
+    def test_robust_open(self, runtime):
+        """Test opening correct shares."""
+        # Shares of 42 using the polynomial 42 + 5x.
+        x = Share(runtime, self.Zp, self.Zp(42 + 5 * runtime.id))
+        opened = runtime.robust_open(x)
+
+        def check(value):
+            self.assertEquals(value, 42)
+            self.assertEquals(runtime.inconsistent_players, set())
+
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_robust_open_wrong_share(self, runtime):
+        """Test opening when player 3 sends a wrong share."""
+        # Shares of 42 using the polynomial 42 + 5x.
+        x = Share(runtime, self.Zp, self.Zp(42 + 5 * runtime.id))
+        if runtime.id == 3:
+            x = x + 1
+        opened = runtime.robust_open(x)
+
+        def check(value):
+            self.assertEquals(value, 42)
+            # Player 3 always uses its own share, so it will have to
+            # decode and will find the wrong share.
+            if runtime.id == 3:
+                self.assertEquals(runtime.inconsistent_players, set([3]))
+
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_robust_open_sorted_cache_keys(self, runtime):
+        """Test that vectors and matrices are cached for sorted points
+        only, whatever the order of arrival."""
+        Zp = GF(find_prime(2**66))
+        x = Share(runtime, Zp, Zp(42 + 5 * runtime.id))
+        opened = runtime.robust_open(x)
+
+        def check(_):
+            cache = shamir.recombination_cache(Zp)
+            for key in cache.vectors:
+                if key[0] == "parity":
+                    xs = key[1]
+                else:
+                    xs = key[:-1]
+                xs = [x.value for x in xs]
+                self.assertEquals(xs, sorted(xs))
+
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_robust_open_receivers(self, runtime):
+        """Test opening to a subset of the players."""
+        # Shares of 42 using the polynomial 42 + 5x.
+        x = Share(runtime, self.Zp, self.Zp(42 + 5 * runtime.id))
+        opened = runtime.robust_open(x, [2, 4])
+        if runtime.id in [2, 4]:
+            opened.addCallback(self.assertEquals, 42)
+            return opened
+        else:
+            self.assertEquals(opened, None)
+
+
 class TriplesHyper(BasicActiveRuntime, TriplesHyperinvertibleMatricesMixin):
     pass
 
@@ -119,6 +200,49 @@ class TriplesHyperTest(RuntimeTestCase):
         return triples
 
 
+class TriplesPRSSTest(RuntimeTestCase):
+    """Test for preprocessing with PRSS."""
+
+    num_players = 4
+
+    runtime_class = ActiveRuntime
+
+    @protocol
+    def test_generate_many_triples(self, runtime):
+        """Test that many triples are generated in one call."""
+
+        def verify(triple):
+            self.assertEquals(triple[0] * triple[1], triple[2])
+
+        triples = runtime.generate_triples(self.Zp, quantity=50, gather=False)
+        self.assertEquals(len(triples), 50)
+
+        results = []
+        for a, b, c in triples:
+            result = gatherResults([runtime.open(a), runtime.open(b),
+                                    runtime.open(c)])
+            result.addCallback(verify)
+            results.append(result)
+        return gatherResults(results)
+
+
+class TriplesHyperNTT(TriplesHyper):
+
+    def __init__(self, player, threshold, options=None):
+        TriplesHyper.__init__(self, player, threshold, options)
+        self.options.ntt = True
+
+class TriplesHyperNTTTest(TriplesHyperTest):
+    """Test for preprocessing with hyper-invertible matrices computed
+    with number-theoretic transforms."""
+
+    runtime_class = TriplesHyperNTT
+
+    def setUp(self):
+        TriplesHyperTest.setUp(self)
+        self.Zp = GF(find_prime(2**64, order=8))
+
+
 class BrachaBroadcastRuntime(ActiveRuntime, BrachaBroadcastMixin):
     pass
 
@@ -18,11 +18,15 @@
 """Tests for viff.aes."""
 
 
+from twisted.trial.unittest import TestCase
+
 from viff.test.util import RuntimeTestCase, protocol
 
 from viff.field import GF256
 from viff.runtime import gather_shares, Share
 from viff.aes import bit_decompose, AES
+from viff.util import rand
+from viff.vector import GF256Vector, numpy
 
 from viff.test.rijndael import S, rijndael
 
@@ -137,3 +141,40 @@ class AESTestCase(RuntimeTestCase):
         expected = [ord(c) for c in r.encrypt(cleartext)]
 
         return self.verify(runtime, [result], [expected])
+
+
+class LocalAESTestCase(TestCase):
+    """Test the AES operations on local GF256Vector states."""
+
+    def setUp(self):
+        self.aes = AES(None, 128, block_size=192, quiet=True)
+        self.states = [[[GF256(rand.randint(0, 255)) for j in range(6)]
+                        for i in range(4)] for _ in range(3)]
+        self.key = [[GF256(rand.randint(0, 255)) for j in range(4)]
+                    for i in range(6)]
+
+    def _test_operation(self, operation):
+        # A batch of states is stored with the batch along the last axis.
+        batch = GF256Vector(self.states).values.transpose(1, 2, 0)
+        batch = GF256Vector(batch)
+        operation(batch)
+        for k, state in enumerate(self.states):
+            single = GF256Vector(state)
+            operation(state)
+            operation(single)
+            self.assertEquals(single.tolist(), state)
+            self.assertEquals(batch[:, :, k], single)
+
+    def test_shift_row(self):
+        self._test_operation(self.aes.shift_row)
+
+    def test_mix_column(self):
+        self._test_operation(
+            lambda state: self.aes.mix_column(state, use_lin_comb=False))
+
+    def test_add_round_key(self):
+        self._test_operation(
+            lambda state: self.aes.add_round_key(state, self.key))
+
+if not numpy:
+    LocalAESTestCase.skip = "Skipped due to missing numpy module."
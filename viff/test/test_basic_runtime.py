@@ -111,3 +111,25 @@ class ProgramCounterTest(RuntimeTestCase):
                 deferreds.extend([d100, d200, d300])
 
         return gatherResults(deferreds)
+
+
+class OffloadTest(RuntimeTestCase):
+    """Tests for the worker pool."""
+
+    def _check_offload(self, runtime):
+        jobs = [(3, i, 1031) for i in range(50)]
+        result = runtime.offload_many(pow, jobs)
+        result.addCallback(self.assertEquals, [pow(*j) for j in jobs])
+        return result
+
+    @protocol
+    def test_offload_without_workers(self, runtime):
+        self.assertIdentical(runtime.workers, None)
+        return self._check_offload(runtime)
+
+    @protocol
+    def test_offload_with_workers(self, runtime):
+        runtime.start_workers(2)
+        result = self._check_offload(runtime)
+        result.addBoth(lambda res: runtime.stop_workers() or res)
+        return result
@@ -0,0 +1,199 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.exchange.
+
+The exchangers are connected by an in-memory byte stream with its
+own framing. No reactor or Twisted transport is involved.
+"""
+
+import os
+import sys
+import struct
+import subprocess
+
+from twisted.trial.unittest import TestCase
+
+import viff
+from viff.exchange import MessageExchanger, shares_per_packet, unpack_shares
+from viff.constants import SHARE, SHARES, TEXT
+from viff.field import GF
+
+#: Declare doctests for Trial.
+__doctests__ = ['viff.exchange']
+
+#: Directory containing the viff package. Trial changes the working
+#: directory when running the tests, so this is found at import time.
+VIFF_PATH = os.path.dirname(os.path.dirname(os.path.abspath(viff.__file__)))
+
+
+class Waiter(object):
+    """Collects the data given to it."""
+
+    def __init__(self):
+        self.results = []
+
+    def callback(self, data):
+        self.results.append(data)
+
+
+class StreamExchanger(MessageExchanger):
+    """An exchanger writing length prefixed frames to a byte buffer.
+
+    The bytes are only read by the peer when :meth:`pump` is called,
+    and they are read in arbitrary chunks to exercise the framing.
+    """
+
+    def __init__(self):
+        MessageExchanger.__init__(self)
+        self.peer = None
+        self.outgoing = ""
+        self.incoming = ""
+        self.errors = []
+
+    def send_frame(self, frame):
+        self.outgoing += struct.pack("!H", len(frame)) + frame
+
+    def frame_error(self, error):
+        self.errors.append(error)
+
+    def pump(self, chunk=3):
+        """Move the outgoing bytes to the peer in small chunks."""
+        data, self.outgoing = self.outgoing, ""
+        for i in range(0, len(data), chunk):
+            self.peer.bytes_received(data[i:i+chunk])
+
+    def bytes_received(self, data):
+        self.incoming += data
+        while len(self.incoming) >= 2:
+            size, = struct.unpack("!H", self.incoming[:2])
+            if len(self.incoming) < 2 + size:
+                break
+            frame = self.incoming[2:2+size]
+            self.incoming = self.incoming[2+size:]
+            self.frame_received(frame)
+
+
+class MessageExchangerTest(TestCase):
+    """Drive two exchangers connected by a byte stream."""
+
+    def setUp(self):
+        self.a = StreamExchanger()
+        self.b = StreamExchanger()
+        self.a.peer = self.b
+        self.b.peer = self.a
+
+    def test_independent_of_twisted(self):
+        """Importing viff.exchange must not import Twisted."""
+        code = ("import sys, viff.exchange; "
+                "print [m for m in sys.modules if m.startswith('twisted')]")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = VIFF_PATH
+        process = subprocess.Popen([sys.executable, "-c", code], env=env,
+                                   stdout=subprocess.PIPE)
+        output = process.communicate()[0]
+        self.assertEquals(process.returncode, 0)
+        self.assertEquals(output.strip(), "[]")
+
+    def test_expect_before_receive(self):
+        waiter = Waiter()
+        self.b.expect_data((1, 2), TEXT, waiter)
+        self.a.sendData((1, 2), TEXT, "hello")
+        self.assertEquals(waiter.results, [])
+        self.a.pump()
+        self.assertEquals(waiter.results, ["hello"])
+        self.assertEquals(self.b.waiting_deferreds, {})
+
+    def test_receive_before_expect(self):
+        self.a.sendData((1, 2), TEXT, "hello")
+        self.a.pump()
+        waiter = Waiter()
+        self.b.expect_data((1, 2), TEXT, waiter)
+        self.assertEquals(waiter.results, ["hello"])
+        self.assertEquals(self.b.incoming_data, {})
+
+    def test_match_program_counter_and_type(self):
+        """Data is only delivered to waiters with the same key."""
+        text, share, other = Waiter(), Waiter(), Waiter()
+        self.b.expect_data((1,), TEXT, text)
+        self.b.expect_data((1,), SHARE, share)
+        self.b.expect_data((2,), TEXT, other)
+        self.a.sendData((2,), TEXT, "two")
+        self.a.sendData((1,), SHARE, "0x1")
+        self.a.sendData((1,), TEXT, "one")
+        self.a.pump()
+        self.assertEquals(text.results, ["one"])
+        self.assertEquals(share.results, ["0x1"])
+        self.assertEquals(other.results, ["two"])
+
+    def test_same_key_in_order(self):
+        """Data with the same key is delivered in the order sent."""
+        first, second, third = Waiter(), Waiter(), Waiter()
+        self.b.expect_data((1,), TEXT, first)
+        self.a.sendData((1,), TEXT, "a")
+        self.a.sendData((1,), TEXT, "b")
+        self.a.sendData((1,), TEXT, "c")
+        self.a.pump()
+        self.b.expect_data((1,), TEXT, second)
+        self.b.expect_data((1,), TEXT, third)
+        self.assertEquals(first.results + second.results + third.results,
+                          ["a", "b", "c"])
+
+    def test_both_directions(self):
+        to_a, to_b = Waiter(), Waiter()
+        self.a.expect_data((0,), TEXT, to_a)
+        self.b.expect_data((0,), TEXT, to_b)
+        self.a.sendData((0,), TEXT, "from a")
+        self.b.sendData((0,), TEXT, "from b")
+        self.a.pump()
+        self.b.pump()
+        self.assertEquals(to_a.results, ["from b"])
+        self.assertEquals(to_b.results, ["from a"])
+
+    def test_send_shares(self):
+        """A long list of shares is split over several frames."""
+        Zp = GF(1031)
+        pc = (3, 4)
+        shares = [Zp(i % 1031) for i in range(50000)]
+        step = shares_per_packet(pc, Zp)
+        waiters = [Waiter() for _ in range(0, len(shares), step)]
+        self.assertTrue(len(waiters) > 1)
+        for waiter in waiters:
+            self.b.expect_data(pc, SHARES, waiter)
+        self.a.sendShares(pc, shares)
+        self.a.pump(chunk=1000)
+        data = "".join([w.results[0] for w in waiters])
+        self.assertEquals(unpack_shares(Zp, data), shares)
+
+    def test_statistics(self):
+        self.a.sendData((1,), TEXT, "abc")
+        self.a.sendData((1, 2), TEXT, "")
+        self.assertEquals(self.a.sent_packets, 2)
+        self.assertEquals(self.a.sent_bytes, (5 + 4 + 3) + (5 + 8))
+
+    def test_malformed_frame(self):
+        """A malformed frame is reported and not delivered."""
+        self.a.send_frame("\x00\x01")
+        self.a.pump()
+        self.assertEquals(len(self.b.errors), 1)
+        self.assertTrue(isinstance(self.b.errors[0], struct.error))
+        self.assertEquals(self.b.incoming_data, {})
+
+    def test_send_frame_not_implemented(self):
+        exchanger = MessageExchanger()
+        self.assertRaises(NotImplementedError,
+                          exchanger.sendData, (1,), TEXT, "")
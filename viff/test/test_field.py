@@ -17,10 +17,15 @@
 
 """Tests for viff.field."""
 
-from viff.field import GF, GF256
+from viff.field import GF, GF256, PackedGF2, _make_field, batch_invert, \
+    MPZ_THRESHOLD
+from viff.shamir import share, recombine
+from viff.util import find_prime, rand
 
 from twisted.trial.unittest import TestCase
 import operator
+import copy
+import pickle
 
 #: Declare doctests for Trial.
 __doctests__ = ['viff.field']
@@ -38,6 +43,16 @@ class GFpElementTest(TestCase):
         self.assertIdentical(self.field.field, self.field)
         self.assertIdentical(self.field(100).field, self.field)
 
+    def test_interned(self):
+        """Test that elements of small fields are shared."""
+        self.assertIdentical(self.field(5), self.field(36))
+        self.assertIdentical(self.field(2) * self.field(3), self.field(6))
+
+    def test_slots(self):
+        """Test that elements have no instance dictionary."""
+        self.assertFalse(hasattr(self.field(5), "__dict__"))
+        self.assertFalse(hasattr(GF(2**61 - 1)(5), "__dict__"))
+
     def _test_binary_operator(self, operation, a, b, expected):
         """Test C{operation} with and without coerced operands."""
         result = operation(self.field(a), self.field(b))
@@ -229,3 +244,165 @@ class GF256Test(TestCase):
         self.assertEquals(str(GF256(0)), "[0]")
         self.assertEquals(str(GF256(1)), "[1]")
         self.assertEquals(str(GF256(10)), "[10]")
+
+
+class MpzFieldTest(TestCase):
+    """Tests comparing fields using Python integers and gmpy integers."""
+
+    def _test_fields(self, bits):
+        """Compare random operations in two fields of size C{bits}."""
+        modulus = find_prime(2**bits)
+        Zp = _make_field(modulus, False)
+        Zq = _make_field(modulus, True)
+        for _ in range(20):
+            a = rand.randint(1, modulus - 1)
+            b = rand.randint(1, modulus - 1)
+            for op in [operator.add, operator.sub, operator.mul,
+                       operator.div]:
+                self.assertEquals(op(Zp(a), Zp(b)).value,
+                                  op(Zq(a), Zq(b)).value)
+                self.assertEquals(op(Zp(a), b).value, op(Zq(a), b).value)
+                self.assertEquals(op(a, Zp(b)).value, op(a, Zq(b)).value)
+            self.assertEquals((~Zp(a)).value, (~Zq(a)).value)
+            self.assertEquals((Zq(a) * ~Zq(a)).value, 1)
+            self.assertEquals((Zp(a)**b).value, (Zq(a)**b).value)
+            self.assertEquals((-Zp(a)).value, (-Zq(a)).value)
+
+    def test_small(self):
+        """Test a 64-bit field."""
+        self._test_fields(64)
+
+    def test_256(self):
+        """Test a 256-bit field."""
+        self._test_fields(256)
+
+    def test_1024(self):
+        """Test a 1024-bit field."""
+        self._test_fields(1024)
+
+    def test_2048(self):
+        """Test a 2048-bit field."""
+        self._test_fields(2048)
+
+    def test_integer_conversion(self):
+        """Test int, long and %d on elements of gmpy based fields."""
+        modulus = find_prime(2**MPZ_THRESHOLD)
+        Zp = GF(modulus)
+        x = Zp(modulus - 1)
+        self.assertEquals(type(int(x)), long)
+        self.assertEquals(int(x), modulus - 1)
+        self.assertEquals(type(long(x)), long)
+        self.assertEquals(long(x), modulus - 1)
+        self.assertEquals("%d" % x, str(modulus - 1))
+        small = Zp(42)
+        self.assertEquals(type(int(small)), int)
+        self.assertEquals(int(small), 42)
+        self.assertEquals(type(long(small)), long)
+        self.assertEquals("%d" % small, "42")
+
+
+class BatchInvertTest(TestCase):
+    """Tests for batch inversion."""
+
+    def test_batch_invert(self):
+        """Compare with inverting each element by itself."""
+        for field in [GF(find_prime(2**64)), GF(find_prime(2**1024)),
+                      GF256]:
+            elements = [field(rand.randint(1, field.modulus - 1))
+                        for _ in range(20)]
+            self.assertEquals(batch_invert(elements),
+                              [~e for e in elements])
+
+    def test_empty(self):
+        """Test inverting no elements."""
+        self.assertEquals(batch_invert([]), [])
+
+
+class PackedGF2Test(TestCase):
+    """Tests comparing packed elements with their GF256 lanes."""
+
+    def setUp(self):
+        self.field = PackedGF2(64)
+        self.a = [GF256(rand.randint(0, 255)) for _ in range(64)]
+        self.b = [GF256(rand.randint(0, 255)) for _ in range(64)]
+
+    def test_lanes(self):
+        """Test conversion to and from lanes."""
+        self.assertEquals(self.field.from_lanes(self.a).lanes(), self.a)
+
+    def test_shamir(self):
+        """Test that every lane is Shamir shared independently."""
+        x = self.field.from_lanes(self.a)
+        shares = share(x, 1, 3)
+        self.assertEquals(recombine(shares[1:]), x)
+        for i in range(64):
+            lane_shares = [(p, s.lanes()[i]) for p, s in shares[:2]]
+            self.assertEquals(recombine(lane_shares), self.a[i])
+
+    def test_add(self):
+        """Test addition."""
+        x = self.field.from_lanes(self.a)
+        y = self.field.from_lanes(self.b)
+        self.assertEquals((x + y).lanes(), map(operator.add, self.a, self.b))
+        self.assertEquals((x + GF256(7)).lanes(),
+                          [e + GF256(7) for e in self.a])
+
+    def test_mul(self):
+        """Test multiplication."""
+        x = self.field.from_lanes(self.a)
+        y = self.field.from_lanes(self.b)
+        self.assertEquals((x * y).lanes(), map(operator.mul, self.a, self.b))
+        c = self.b[0]
+        self.assertEquals((x * c).lanes(), [e * c for e in self.a])
+        self.assertEquals((c * x).lanes(), [c * e for e in self.a])
+
+    def test_bits(self):
+        """Test that bit vectors multiply to the bitwise and."""
+        a = rand.randint(0, 2**64 - 1)
+        b = rand.randint(0, 2**64 - 1)
+        self.assertEquals(self.field(a) * self.field(b), self.field(a & b))
+        self.assertEquals(self.field(a) + self.field(b), self.field(a ^ b))
+
+    def test_constant(self):
+        """Test broadcasting a GF256 element to all lanes."""
+        self.assertEquals(self.field.constant(GF256(3)).lanes(),
+                          [GF256(3)] * 64)
+
+
+class PickleTest(TestCase):
+    """Tests for pickling and copying field elements."""
+
+    def _test_pickle(self, element):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(element, protocol))
+            self.assertEquals(copy, element)
+            self.assertEquals(copy.field, element.field)
+
+    def test_gf256(self):
+        """Test GF256 elements, which are interned."""
+        self._test_pickle(GF256(7))
+        self.assertIdentical(pickle.loads(pickle.dumps(GF256(7))),
+                             GF256(7))
+
+    def test_interned_prime_field(self):
+        """Test elements of a small prime field, which are interned."""
+        Zp = GF(1021)
+        self._test_pickle(Zp(1000))
+        self.assertIdentical(pickle.loads(pickle.dumps(Zp(1000))),
+                             Zp(1000))
+
+    def test_large_prime_field(self):
+        """Test elements of a prime field using gmpy integers."""
+        Zp = GF(find_prime(2**256))
+        self._test_pickle(Zp(2**200 + 17))
+
+    def test_packed(self):
+        """Test packed GF(2) elements."""
+        self._test_pickle(PackedGF2(16)(0x1234))
+
+    def test_copy(self):
+        """Test that copying gives equal elements."""
+        Zp = GF(find_prime(2**64))
+        for element in [GF256(7), Zp(42), PackedGF2(8)(3)]:
+            self.assertEquals(copy.copy(element), element)
+            self.assertEquals(copy.deepcopy(element), element)
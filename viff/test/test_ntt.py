@@ -0,0 +1,74 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+#: Declare doctests for Trial.
+__doctests__ = ['viff.ntt']
+
+from twisted.trial.unittest import TestCase
+
+from viff import ntt, shamir
+from viff.field import GF
+from viff.matrix import Matrix
+from viff.prss import generate_subsets
+from viff.util import find_prime
+
+
+class NTTTest(TestCase):
+    """Tests for number-theoretic transforms."""
+
+    def setUp(self):
+        self.Zp = GF(find_prime(2**64, order=64))
+
+    def test_inverse(self):
+        """Check that intt undoes ntt."""
+        root = ntt.root_of_unity(self.Zp, 32)
+        values = [self.Zp(i**3 + 7) for i in range(32)]
+        self.assertEquals(ntt.intt(ntt.ntt(values, root), root), values)
+
+    def test_share(self):
+        """Check that shares recombine with Lagrange interpolation."""
+        secret = self.Zp(42)
+        for n in [2, 3, 7, 8, 13]:
+            shares = ntt.share(secret, (n - 1) // 2, n)
+            self.assertEquals(len(shares), n)
+            self.assertEquals(shamir.recombine(shares[-(n+1)//2:]), secret)
+            self.assertEquals(ntt.recombine(shares), secret)
+
+    def test_share_too_large(self):
+        """Fields without roots of unity are rejected."""
+        self.assertRaises(AssertionError, ntt.share, GF(19)(1), 1, 8)
+
+    def test_hyper_mul(self):
+        """Check hyper_mul against the explicit matrix."""
+        for n in [1, 2, 5, 8]:
+            vector = [self.Zp(i**2 + 1) for i in range(n)]
+            product = ntt.hyper(n, self.Zp) * Matrix([vector]).transpose()
+            self.assertEquals(ntt.hyper_mul(vector),
+                              product.transpose().rows[0])
+
+    def test_hyper(self):
+        """Check that the matrix is hyper-invertible."""
+        Zp = GF(find_prime(100, order=16))
+        for n in range(1, 6):
+            mat = ntt.hyper(n, Zp)
+            for size in range(1, n+1):
+                subsets = generate_subsets(frozenset(range(n)), size)
+                for rows in subsets:
+                    for columns in subsets:
+                        sub = Matrix([[mat[r, c] for c in columns]
+                                      for r in rows])
+                        self.assertNotEquals(sub.determinant(), 0)
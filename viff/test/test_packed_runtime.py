@@ -0,0 +1,75 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.packed."""
+
+from twisted.internet.defer import gatherResults
+
+from viff.packed import PackedShamirRuntime
+from viff.test.util import RuntimeTestCase, protocol
+
+
+class PackedShamirRuntimeTest(RuntimeTestCase):
+    """Test the packed Shamir runtime with two secrets per sharing."""
+
+    num_players = 5
+    threshold = 1
+    runtime_class = PackedShamirRuntime
+
+    def _share(self, runtime, numbers):
+        """Share input from players 1 and 2."""
+        if runtime.id in (1, 2):
+            return runtime.shamir_share([1, 2], self.Zp, numbers)
+        else:
+            return runtime.shamir_share([1, 2], self.Zp)
+
+    def _check(self, runtime, share, expected):
+        opened = runtime.open(share)
+        opened.addCallback(self.assertEquals, map(self.Zp, expected))
+        return opened
+
+    @protocol
+    def test_share_open(self, runtime):
+        a, b = self._share(runtime, [10 * runtime.id, 10 * runtime.id + 1])
+        return gatherResults([self._check(runtime, a, [10, 11]),
+                              self._check(runtime, b, [20, 21])])
+
+    @protocol
+    def test_short_input(self, runtime):
+        if runtime.id == 3:
+            a = runtime.shamir_share([3], self.Zp, [7])
+        else:
+            a = runtime.shamir_share([3], self.Zp)
+        return self._check(runtime, a, [7, 0])
+
+    @protocol
+    def test_add(self, runtime):
+        a, b = self._share(runtime, [runtime.id, 5])
+        return gatherResults([self._check(runtime, a + b, [3, 10]),
+                              self._check(runtime, a + 4, [5, 9])])
+
+    @protocol
+    def test_mul(self, runtime):
+        a, b = self._share(runtime, [runtime.id + 2, 3 * runtime.id])
+        c = a * b
+        return gatherResults([self._check(runtime, c, [3 * 4, 3 * 6]),
+                              self._check(runtime, c * 2, [24, 36])])
+
+    @protocol
+    def test_mul_twice(self, runtime):
+        a, b = self._share(runtime, [runtime.id, 2])
+        return self._check(runtime, a * b * a, [1 * 2 * 1, 2 * 2 * 2])
@@ -0,0 +1,51 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.paillier."""
+
+from viff.config import generate_configs
+from viff.paillier import PaillierRuntime
+from viff.paillierutil import ViffPaillier
+from viff.runtime import Share
+from viff.test.util import RuntimeTestCase, protocol
+
+
+class PaillierRuntimeTest(RuntimeTestCase):
+    """Test the two-player Paillier runtime."""
+
+    num_players = 2
+    runtime_class = PaillierRuntime
+
+    def generate_configs(self, n, t):
+        # Small keys are enough for the 65 bit test field.
+        return generate_configs(n, t, paillier=ViffPaillier(512))
+
+    @protocol
+    def test_mul(self, runtime):
+        a, b = runtime.share([1, 2], self.Zp, 1000 + runtime.id)
+        c = runtime.open(a * b)
+        c.addCallback(self.assertEquals, 1001 * 1002)
+        return c
+
+    @protocol
+    def test_mul_with_workers(self, runtime):
+        runtime.start_workers(2)
+        a, b = runtime.share([1, 2], self.Zp, 1000 + runtime.id)
+        c = runtime.open(a * b)
+        c.addCallback(self.assertEquals, 1001 * 1002)
+        c.addBoth(lambda result: runtime.stop_workers() or result)
+        return c
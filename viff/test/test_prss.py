@@ -17,7 +17,12 @@
 
 """Tests for viff.prss."""
 
-from viff.prss import generate_subsets
+from viff.prss import generate_subsets, iter_subsets, PRSSBuffer, PRFMap, \
+    PRF, CounterPRF, prss, prss_multi, prss_lsb
+from viff.field import GF, GF256
+from viff.shamir import recombine
+from viff.util import find_prime, _OrderedDict, _combinations
+from viff import prss as prss_module
 
 from twisted.trial.unittest import TestCase
 
@@ -67,3 +72,173 @@ class PRSSTest(TestCase):
                         self.assertEquals(frozenset([]), union)
                     else:
                         self.assertEquals(set, union)
+
+    def test_iter_subsets_fallback(self):
+        """Test subsets generated as before Python 2.6."""
+        expected = [list(iter_subsets(range(1, n+1), size))
+                    for n in range(6) for size in range(n+2)]
+        self.patch(prss_module, "combinations", _combinations)
+        self.assertEquals([list(iter_subsets(range(1, n+1), size))
+                           for n in range(6) for size in range(n+2)],
+                          expected)
+
+
+class FakeCall(object):
+    """A scheduled call which is never run by itself."""
+
+    def __init__(self, func):
+        self.func = func
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class PRSSBufferTest(TestCase):
+    """Tests of the PRSS buffer without an event loop."""
+
+    def setUp(self):
+        self.calls = []
+        self.buffer = PRSSBuffer(3, schedule=self.schedule)
+
+    def schedule(self, func):
+        call = FakeCall(func)
+        self.calls.append(call)
+        return call
+
+    def test_schedule(self):
+        """Values are computed one at a time by scheduled calls."""
+        square = lambda key: key[-1]**2
+        self.assertEquals(self.buffer.get("sq", (0, 1), square), 1)
+        self.assertEquals(len(self.calls), 1)
+        # Run the scheduled calls like an event loop would do.
+        runs = 0
+        while self.calls:
+            self.calls.pop(0).func()
+            runs += 1
+        self.assertEquals(runs, 3)
+        for i in range(2, 5):
+            self.assertEquals(self.buffer.get("sq", (0, i), square), i**2)
+        self.assertEquals((self.buffer.hits, self.buffer.misses), (3, 1))
+
+    def test_size(self):
+        """The oldest values are discarded when the buffer is full."""
+        self.buffer.size = 2
+        square = lambda key: key[-1]**2
+        self.buffer.get("sq", (0, 1), square)
+        for _ in range(3):
+            self.buffer.fill()
+        self.assertEquals(sorted(self.buffer._values),
+                          [("sq", (0, 3)), ("sq", (0, 4))])
+        self.buffer.get("sq", (0, 2), square)
+        self.assertEquals(self.buffer.misses, 2)
+
+    def test_stop(self):
+        """Stopping cancels the scheduled call and pending values."""
+        self.buffer.get("sq", (0, 1), lambda key: key[-1]**2)
+        self.buffer.stop()
+        self.assertTrue(self.calls[0].cancelled)
+        self.buffer.fill()
+        self.buffer.get("sq", (0, 2), lambda key: key[-1]**2)
+        self.assertEquals(len(self.calls), 1)
+        self.assertEquals(self.buffer.misses, 2)
+
+
+def per_subset_coefficient(n, j, field, subset):
+    """The coefficient of the PRF for *subset* computed by
+    interpolation, as PRSS did before the table of coefficients."""
+    points = [(field.scalar_field(x), 0)
+              for x in range(1, n+1) if x not in subset]
+    points.append((0, 1))
+    return recombine(points, j)
+
+
+def per_subset_prss(n, j, field, prfs, key, quantity=None):
+    """Compute PRSS shares subset by subset."""
+    if quantity is None:
+        values = [(s, [prf(key)]) for s, prf in prfs.iteritems() if j in s]
+    else:
+        values = [(s, prf.stream(key, quantity))
+                  for s, prf in prfs.iteritems() if j in s]
+    result = [field(0)] * (quantity or 1)
+    for subset, stream in values:
+        coefficient = per_subset_coefficient(n, j, field, subset)
+        for i, value in enumerate(stream):
+            result[i] += field(value) * coefficient
+    return result
+
+
+class FallbackPRSSBufferTest(PRSSBufferTest):
+    """Tests of the PRSS buffer as used before Python 2.7."""
+
+    def setUp(self):
+        self.patch(prss_module, "OrderedDict", _OrderedDict)
+        PRSSBufferTest.setUp(self)
+
+
+class PRSSTableTest(TestCase):
+    """Compare the table based PRSS with a per-subset computation."""
+
+    #: Pairs of (n, t).
+    thresholds = [(3, 1), (4, 1), (5, 2), (7, 3)]
+
+    def make_prfs(self, n, t, PRF, max, j=None):
+        """Return PRFs for all subsets of size n - t, or only those
+        with player *j* if given."""
+        prfs = PRFMap()
+        for subset in iter_subsets(range(1, n+1), n-t):
+            if j is None or j in subset:
+                prfs[subset] = PRF(str(sorted(subset)), max)
+        return prfs
+
+    def test_prss(self):
+        for field in GF(1031), GF(find_prime(2**64)):
+            for n, t in self.thresholds:
+                for prf_class in PRF, CounterPRF:
+                    prfs = self.make_prfs(n, t, prf_class, field.modulus)
+                    for j in range(1, n+1):
+                        for key in (0, 1), (4, 2, 7):
+                            self.assertEquals(
+                                prss(n, j, field, prfs, key),
+                                per_subset_prss(n, j, field, prfs, key)[0])
+
+    def test_prss_gf256(self):
+        for n, t in self.thresholds:
+            prfs = self.make_prfs(n, t, PRF, 256)
+            for j in range(1, n+1):
+                self.assertEquals(prss(n, j, GF256, prfs, (1, 2)),
+                                  per_subset_prss(n, j, GF256, prfs,
+                                                  (1, 2))[0])
+
+    def test_prss_multi(self):
+        field = GF(find_prime(2**64))
+        for n, t in self.thresholds:
+            prfs = self.make_prfs(n, t, CounterPRF, field.modulus)
+            for j in range(1, n+1):
+                self.assertEquals(prss_multi(n, j, field, prfs, (3, 1), 5),
+                                  per_subset_prss(n, j, field, prfs,
+                                                  (3, 1), 5))
+
+    def test_prss_lsb(self):
+        field = GF(find_prime(2**64))
+        for n, t in self.thresholds:
+            prfs = self.make_prfs(n, t, PRF, 2**32)
+            for j in range(1, n+1):
+                share, bit = prss_lsb(n, j, field, prfs, (5,))
+                self.assertEquals(share,
+                                  per_subset_prss(n, j, field, prfs, (5,))[0])
+                bits = PRFMap()
+                for subset, prf in prfs.iteritems():
+                    bits[subset] = lambda key, prf=prf: prf(key) & 1
+                self.assertEquals(bit,
+                                  per_subset_prss(n, j, GF256, bits, (5,))[0])
+
+    def test_only_own_subsets(self):
+        """The PRFs of a player only cover its own subsets."""
+        field = GF(1031)
+        for n, t in self.thresholds:
+            for j in range(1, n+1):
+                prfs = self.make_prfs(n, t, PRF, 1031, j)
+                self.assertEquals(prss(n, j, field, prfs, (2, 2)),
+                                  per_subset_prss(n, j, field, prfs,
+                                                  (2, 2))[0])
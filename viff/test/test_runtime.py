@@ -29,7 +29,8 @@ import operator
 
 from twisted.internet.defer import gatherResults, Deferred, DeferredList
 
-from viff.field import GF256
+from viff import shamir
+from viff.field import GF, GF256, PackedGF2
 from viff.runtime import Share
 from viff.constants import SHARE
 from viff.comparison import Toft05Runtime
@@ -51,6 +52,54 @@ class MulTest(BinaryOperatorTestCase, RuntimeTestCase):
     operator = operator.mul
 
 
+class ResharersTest(RuntimeTestCase):
+    """Test multiplication with other resharers than players 1 to 2t+1."""
+
+    num_players = 4
+
+    def _check_mul(self, runtime, multiply):
+        runtime.resharers = [2, 3, 4]
+        a = Share(runtime, self.Zp, self.Zp(6 + runtime.id))
+        b = Share(runtime, self.Zp, self.Zp(7 + 2 * runtime.id))
+
+        if runtime.id == 1:
+            # The operands are known, so any resharing would be sent
+            # right away.
+            def fail(*args):
+                self.fail("Player 1 should not reshare")
+            for protocol in runtime.protocols.itervalues():
+                protocol.sendShare = protocol.sendShares = fail
+            c = multiply(a, b)
+            for protocol in runtime.protocols.itervalues():
+                del protocol.sendShare, protocol.sendShares
+        else:
+            c = multiply(a, b)
+
+        opened = runtime.open(c)
+        opened.addCallback(self.assertEquals, 6 * 7)
+        return opened
+
+    @protocol
+    def test_mul(self, runtime):
+        return self._check_mul(runtime, operator.mul)
+
+    @protocol
+    def test_mul_many(self, runtime):
+        return self._check_mul(runtime,
+                               lambda a, b: runtime.mul_many([a], [b])[0])
+
+    @protocol
+    def test_invalid_resharers(self, runtime):
+        """Test that bad resharers are rejected before multiplying."""
+        a = Share(runtime, self.Zp, self.Zp(2))
+        b = Share(runtime, self.Zp, self.Zp(3))
+        for resharers in [[1, 2], [1, 2, 3, 4], [2, 2, 3], [1, 2, 5]]:
+            runtime.resharers = resharers
+            self.assertRaises(ValueError, runtime.check_resharers)
+            self.assertRaises(ValueError, runtime.mul, a, b)
+            self.assertRaises(ValueError, runtime.mul_many, [a], [b])
+
+
 class PowTest(RuntimeTestCase):
     """Tests power to known integer"""
 
@@ -192,6 +241,80 @@ class RuntimeTest(RuntimeTestCase):
 
         return gatherResults([opened_a, opened_b, opened_c])
 
+    @protocol
+    def test_shamir_share_vector(self, runtime):
+        """Test symmetric Shamir sharing of lists."""
+        inputs = [100 * runtime.id + i for i in range(20)]
+        result = runtime.shamir_share_vector([1, 2, 3], self.Zp, inputs)
+        self.assertEquals(len(result), 3)
+
+        opened = []
+        for player, shares in zip([1, 2, 3], result):
+            self.assertEquals(len(shares), 20)
+            self.assert_type(shares[0], Share)
+            values = gatherResults([runtime.open(s) for s in shares])
+            values.addCallback(self.assertEquals,
+                               [100 * player + i for i in range(20)])
+            opened.append(values)
+        return gatherResults(opened)
+
+    @protocol
+    def test_shamir_share_vector_asymmetric(self, runtime):
+        """Test Shamir sharing of a list from a single inputter."""
+        if runtime.id == 3:
+            shares = runtime.shamir_share_vector([3], GF256, [1, 2, 3])
+        else:
+            shares = runtime.shamir_share_vector([3], GF256, quantity=3)
+
+        opened = gatherResults([runtime.open(s) for s in shares])
+        opened.addCallback(self.assertEquals, [1, 2, 3])
+        return opened
+
+    @protocol
+    def test_shamir_share_vector_empty(self, runtime):
+        """Test Shamir sharing of empty lists."""
+        result = runtime.shamir_share_vector([1, 2, 3], self.Zp, [])
+        self.assertEquals(result, [[], [], []])
+
+    @protocol
+    def test_mul_many(self, runtime):
+        """Test element-wise multiplication of lists of shares."""
+        a = [Share(runtime, self.Zp, self.Zp(i)) for i in range(10)]
+        b = [Share(runtime, self.Zp, self.Zp(i + 5)) for i in range(10)]
+        c = runtime.mul_many(a, b)
+        self.assertEquals(len(c), 10)
+        self.assert_type(c[0], Share)
+
+        opened = gatherResults([runtime.open(s) for s in c])
+        opened.addCallback(self.assertEquals,
+                           [i * (i + 5) for i in range(10)])
+        return opened
+
+    @protocol
+    def test_mul_many_gf256(self, runtime):
+        """Test element-wise multiplication of GF256 shares."""
+        a = [Share(runtime, GF256, GF256(i)) for i in range(1, 5)]
+        b = [Share(runtime, GF256, GF256(3)) for i in range(1, 5)]
+        c = runtime.mul_many(a, b)
+
+        opened = gatherResults([runtime.open(s) for s in c])
+        opened.addCallback(self.assertEquals,
+                           [GF256(i) * GF256(3) for i in range(1, 5)])
+        return opened
+
+    @protocol
+    def test_precompute_recombination(self, runtime):
+        """Test that opening uses the precomputed vectors."""
+        runtime.precompute_recombination(self.Zp)
+        cache = shamir.recombination_cache(self.Zp)
+        misses = cache.misses
+
+        a = runtime.shamir_share([1], self.Zp, 42 if runtime.id == 1 else None)
+        opened = runtime.open(a)
+        opened.addCallback(self.assertEquals, 42)
+        opened.addCallback(lambda _: self.assertEquals(cache.misses, misses))
+        return opened
+
     @protocol
     def test_send_receive_self(self, runtime):
         """Test send and receive of values."""
@@ -233,9 +356,69 @@ class RuntimeTest(RuntimeTestCase):
         dls.addCallback(check)
         return dls
 
+    @protocol
+    def test_send_receive_shares(self, runtime):
+        """Test send and receive of share vectors over several packets."""
+        Zp = GF(1031)
+        values = [Zp(i) for i in range(30000)]
+
+        pc = tuple(runtime.program_counter)
+        for peer_id in runtime.players:
+            runtime.protocols[peer_id].sendShares(pc, values)
+
+        ds = [runtime._expect_shares(peer_id, Zp, len(values))
+              for peer_id in runtime.players]
+        for d in ds:
+            d.addCallback(self.assertEquals, values)
+        return gatherResults(ds)
 
 
 
+
+class PackedGF2Test(RuntimeTestCase):
+    """Test operations on shares of packed bit vectors."""
+
+    field = PackedGF2(64)
+
+    @protocol
+    def test_xor_and(self, runtime):
+        """Test xor and and of shared bit vectors."""
+        inputs = [0x0123456789abcdef, 0xfedcba9876543210, 0xffff0000ffff0000]
+        a, b, c = runtime.shamir_share([1, 2, 3], self.field,
+                                       inputs[runtime.id - 1])
+        opened_xor = runtime.open(a ^ b)
+        opened_xor.addCallback(self.assertEquals,
+                               self.field(inputs[0] ^ inputs[1]))
+        opened_and = runtime.open(a * c)
+        opened_and.addCallback(self.assertEquals,
+                               self.field(inputs[0] & inputs[2]))
+        return gatherResults([opened_xor, opened_and])
+
+    @protocol
+    def test_mul_many(self, runtime):
+        """Test and of lists of shared bit vectors."""
+        inputs = [0x0123456789abcdef, 0xfedcba9876543210, 0xffff0000ffff0000]
+        a, b, c = runtime.shamir_share([1, 2, 3], self.field,
+                                       inputs[runtime.id - 1])
+        products = runtime.mul_many([a, b], [c, c])
+        opened = gatherResults([runtime.open(p) for p in products])
+        opened.addCallback(self.assertEquals,
+                           [self.field(inputs[0] & inputs[2]),
+                            self.field(inputs[1] & inputs[2])])
+        return opened
+
+    @protocol
+    def test_prss_share_random_binary(self, runtime):
+        """Test that random binary elements are bit vectors."""
+        share = runtime.prss_share_random(self.field, binary=True)
+        opened = runtime.open(share)
+
+        def check(bits):
+            self.assertEquals(bits.value, bits.value & (2**64 - 1))
+        opened.addCallback(check)
+        return opened
+
+
 class ConvertBitShareTest(RuntimeTestCase):
     runtime_class = Toft05Runtime
 
@@ -116,3 +116,35 @@ class RuntimeOpenTest(RuntimeTestCase):
         receivers = r.sample(range(1, len(runtime.players) + 1),
                              no_of_receivers)
         return self._test_open(runtime, receivers)
+
+    @protocol
+    def test_open_many(self, runtime):
+        """Test opening a list of sharings in one round."""
+        # The sharings are polynomials f(x) = i + 7 * x.
+        shares = [Share(runtime, self.Zp, self.Zp(i + 7 * runtime.id))
+                  for i in range(100)]
+        opened = runtime.open_many(shares)
+        self.assert_type(opened, Share)
+        opened.addCallback(self.assertEquals, range(100))
+        return opened
+
+    @protocol
+    def test_open_many_receivers(self, runtime):
+        """Test opening a list of sharings to some of the players."""
+        shares = [Share(runtime, self.Zp, self.Zp(i + 7 * runtime.id))
+                  for i in range(10)]
+        receivers = [1, 3]
+        opened = runtime.open_many(shares, receivers)
+        if runtime.id in receivers:
+            opened.addCallback(self.assertEquals, range(10))
+            return opened
+        else:
+            self.assertEquals(None, opened)
+
+    @protocol
+    def test_open_many_threshold(self, runtime):
+        """Test opening a list of degree 2t sharings."""
+        shares = runtime.prss_share_zero(self.Zp, 5)
+        opened = runtime.open_many(shares, threshold=2*runtime.threshold)
+        opened.addCallback(self.assertEquals, [0] * 5)
+        return opened
@@ -18,8 +18,10 @@
 """Tests for the prss based protocols in the viff.runtime."""
 
 from viff.runtime import Share, gather_shares
+from viff.config import generate_configs, load_config, derive_prss_keys
+from viff.prss import PRSSBuffer, prss
 from viff.test.util import RuntimeTestCase, protocol
-from viff.field import GF256
+from viff.field import GF, GF256
 
 
 class RuntimePrssTest(RuntimeTestCase):
@@ -95,6 +97,34 @@ class RuntimePrssTest(RuntimeTestCase):
 
         return gather_shares([opened_a, opened_b, opened_c])
 
+    @protocol
+    def test_prss_share_many_int(self, runtime):
+        """Test sharing of many Zp elements using PRSS."""
+        inputs = [100 * runtime.id + i for i in range(50)]
+        result = runtime.prss_share_many(runtime.players, self.Zp, inputs)
+        self.assertEquals(len(result), 3)
+
+        opened = []
+        for player, shares in zip([1, 2, 3], result):
+            self.assertEquals(len(shares), 50)
+            values = gather_shares([runtime.open(s) for s in shares])
+            values.addCallback(self.assertEquals,
+                               [100 * player + i for i in range(50)])
+            opened.append(values)
+        return gather_shares(opened)
+
+    @protocol
+    def test_prss_share_many_asymmetric(self, runtime):
+        """Test sharing of many GF256 elements from a single dealer."""
+        if runtime.id == 2:
+            shares = runtime.prss_share_many([2], GF256, [1, 2, 3])
+        else:
+            shares = runtime.prss_share_many([2], GF256, quantity=3)
+
+        opened = gather_shares([runtime.open(s) for s in shares])
+        opened.addCallback(self.assertEquals, [1, 2, 3])
+        return opened
+
     @protocol
     def test_prss_share_random_bit(self, runtime):
         """Tests the sharing of a 0/1 GF256 element using PRSS."""
@@ -115,6 +145,45 @@ class RuntimePrssTest(RuntimeTestCase):
         opened_a.addCallback(self.assertIn, [self.Zp(0), self.Zp(1)])
         return opened_a
 
+    @protocol
+    def test_prss_share_random_bits(self, runtime):
+        """Tests the sharing of many 0/1 Zp elements using PRSS."""
+        a_list = runtime.prss_share_random_bits(self.Zp, 20)
+        bits = [self.Zp(0), self.Zp(1)]
+        self.assertEquals(len(a_list), 20)
+
+        opened = gather_shares([runtime.open(a) for a in a_list])
+        opened.addCallback(lambda values:
+                               self.assertEquals(set(values) - set(bits),
+                                                 set()))
+        return opened
+
+    @protocol
+    def test_prss_share_random_bits_retry(self, runtime):
+        """Tests random bits in a field small enough for retries."""
+        Zp = GF(7)
+        a_list = runtime.prss_share_random_bits(Zp, 50)
+
+        def check(values):
+            self.assertEquals(len(values), 50)
+            self.assertEquals(set(values), set([Zp(0), Zp(1)]))
+
+        opened = gather_shares([runtime.open(a) for a in a_list])
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_prss_share_random_bits_gf256(self, runtime):
+        """Tests the sharing of several 0/1 GF256 elements using PRSS."""
+        a_list = runtime.prss_share_random_bits(GF256, 8)
+        bits = [GF256(0), GF256(1)]
+
+        opened = gather_shares([runtime.open(a) for a in a_list])
+        opened.addCallback(lambda values:
+                               self.assertEquals(set(values) - set(bits),
+                                                 set()))
+        return opened
+
     @protocol
     def test_prss_share_random_multi_bit(self, runtime):
         """Tests the sharing of several 0/1 GF256 elements using PRSS."""
@@ -127,6 +196,35 @@ class RuntimePrssTest(RuntimeTestCase):
 
         return gather_shares(a_list)
 
+    @protocol
+    def test_prss_share_random_multi_int(self, runtime):
+        """Tests the sharing of many random Zp elements using PRSS."""
+        a_list = runtime.prss_share_random_multi(field=self.Zp, quantity=100)
+        self.assertEquals(len(a_list), 100)
+
+        opened = gather_shares([runtime.open(a) for a in a_list])
+        opened.addCallback(lambda values:
+                               self.assertEquals(len(set(values)), 100))
+        return opened
+
+    @protocol
+    def test_prss_share_zero_many(self, runtime):
+        """Tests the sharing of many zero Zp elements using PRSS."""
+        a_list = runtime.prss_share_zero(self.Zp, 10)
+
+        def check_shares(shares):
+            # The zero-sharings must use different polynomials.
+            self.assertEquals(len(set(shares)), 10)
+
+        shares = gather_shares(a_list)
+        shares.addCallback(check_shares)
+
+        opened = [runtime.open(a, threshold=2*runtime.threshold)
+                  for a in a_list]
+        for o in opened:
+            o.addCallback(self.assertEquals, self.Zp(0))
+        return gather_shares([shares] + opened)
+
     @protocol
     def test_prss_share_zero_bit(self, runtime):
         """Tests the sharing of a zero GF256 element using PRSS."""
@@ -189,3 +287,66 @@ class RuntimePrssTest(RuntimeTestCase):
         result = gather_shares([runtime.open(bit_p), runtime.open(bit_b)])
         result.addCallback(lambda (a, b): self.assertEquals(a.value, b.value))
         return result
+
+
+class PRSSBufferTest(RuntimeTestCase):
+    """Tests of the speculative PRSS buffer."""
+
+    @protocol
+    def test_buffer_hits(self, runtime):
+        """Test that upcoming PRSS values are computed ahead of time."""
+        # Values are only computed when fill is called below.
+        runtime.prss_buffer = PRSSBuffer(4)
+        prfs = runtime.players[runtime.id].prfs(self.Zp.modulus)
+
+        def check(share):
+            key = tuple(runtime.program_counter)
+            expected = prss(runtime.num_players, runtime.id, self.Zp,
+                            prfs, key)
+            share.addCallback(self.assertEquals, expected)
+            return share
+
+        first = check(runtime.prss_share_random(self.Zp))
+        self.assertEquals(runtime.prss_buffer.misses, 1)
+
+        for _ in range(4):
+            runtime.prss_buffer.fill()
+        shares = [check(runtime.prss_share_random(self.Zp))
+                  for _ in range(4)]
+        self.assertEquals(runtime.prss_buffer.hits, 4)
+        self.assertEquals(runtime.prss_buffer.hit_rate(), 0.8)
+        return gather_shares([first] + shares)
+
+
+class KDFRuntimePrssTest(RuntimePrssTest):
+    """Tests the prss based protocols with keys derived from a seed."""
+
+    def generate_configs(self, *args):
+        return generate_configs(kdf=True, *args)
+
+    def setUp(self):
+        result = RuntimePrssTest.setUp(self)
+        # Loading the configurations warns since they are insecure.
+        warnings = self.flushWarnings()
+        self.assertEquals(len(warnings), self.num_players)
+        for warning in warnings:
+            self.assertEquals(warning['category'], RuntimeWarning)
+        return result
+
+    def test_load_config(self):
+        """Keys are derived for the highest player ID."""
+        configs = generate_configs(self.num_players, self.threshold,
+                                   kdf=True)
+        config = configs[1]
+        del config['Player 2']
+        _, players = load_config(config)
+
+        warnings = self.flushWarnings()
+        self.assertEquals(len(warnings), 1)
+        self.assertEquals(warnings[0]['category'], RuntimeWarning)
+
+        seed = config['Player 1']['prss_kdf']['seed']
+        keys, dealer_keys = derive_prss_keys(seed, self.num_players,
+                                             self.threshold, 1)
+        self.assertEquals(players[1].keys, keys)
+        self.assertEquals(players[1].dealer_keys, dealer_keys)
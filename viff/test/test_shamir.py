@@ -15,5 +15,197 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
 
+"""Tests for viff.shamir."""
+
+from twisted.trial.unittest import TestCase, SkipTest
+
+from viff import shamir
+from viff.field import GF, GF256, PackedGF2
+from viff.util import find_prime, rand, _OrderedDict
+
 #: Declare doctests for Trial.
 __doctests__ = ['viff.shamir']
+
+
+class VerifySharingTest(TestCase):
+    """Tests for viff.shamir.verify_sharing."""
+
+    def setUp(self):
+        self.Zp = GF(find_prime(2**64))
+
+    def test_accept(self):
+        """Test that correct sharings are accepted."""
+        for field in self.Zp, GF256:
+            for degree in range(4):
+                shares = shamir.share(field(42), degree, 7)
+                self.assertTrue(shamir.verify_sharing(shares, degree))
+                # A higher degree is accepted too.
+                self.assertTrue(shamir.verify_sharing(shares, degree + 1))
+
+    def test_reject(self):
+        """Test that changing a single share is detected."""
+        for field in self.Zp, GF256:
+            for degree in range(4):
+                shares = shamir.share(field(42), degree, 7)
+                for i in range(7):
+                    bad = list(shares)
+                    bad[i] = (bad[i][0], bad[i][1] + field(1))
+                    self.assertFalse(shamir.verify_sharing(bad, degree))
+
+    def test_reject_degree(self):
+        """Test that a sharing of too high degree is rejected."""
+        shares = shamir.share(self.Zp(42), 3, 7)
+        self.assertFalse(shamir.verify_sharing(shares, 2))
+
+    def test_order(self):
+        """Test that the order of the shares does not matter."""
+        shares = shamir.share(self.Zp(42), 2, 7)
+        shares.reverse()
+        self.assertTrue(shamir.verify_sharing(shares, 2))
+        shares[0] = (shares[0][0], shares[0][1] + 1)
+        self.assertFalse(shamir.verify_sharing(shares, 2))
+
+    def test_cached_once(self):
+        """Test that a set of points is stored once in the cache."""
+        Zp = GF(find_prime(2**70))
+        cache = shamir.recombination_cache(Zp)
+        shares = shamir.share(Zp(42), 1, 4)
+        shamir.verify_sharing(shares, 1)
+        size = len(cache)
+        shamir.verify_sharing(list(reversed(shares)), 1)
+        shamir.verify_sharing(shares[2:] + shares[:2], 1)
+        self.assertEquals(len(cache), size)
+
+
+class VerifySharingsTest(TestCase):
+    """Tests for viff.shamir.verify_sharings."""
+
+    def setUp(self):
+        self.fields = [GF(find_prime(2**64)), GF256]
+
+    def sharings(self, field, degree, count=10, num_players=7):
+        return [shamir.share(field(i), degree, num_players)
+                for i in range(count)]
+
+    def test_accept(self):
+        """Test that batches of correct sharings are accepted."""
+        for field in self.fields:
+            for degree in range(4):
+                sharings = self.sharings(field, degree)
+                self.assertTrue(shamir.verify_sharings(sharings, degree))
+                self.assertTrue(shamir.verify_sharings(sharings[:1], degree))
+
+    def test_reject(self):
+        """Test that a batch with one changed share is rejected.
+
+        A single wrong sharing is caught by any combination, since
+        its coefficient is never zero.
+        """
+        for field in self.fields:
+            for k in 0, 4, 9:
+                for player in 0, 3, 6:
+                    sharings = self.sharings(field, 2)
+                    x, y = sharings[k][player]
+                    sharings[k][player] = (x, y + field(1))
+                    self.assertFalse(shamir.verify_sharings(sharings, 2))
+
+    def test_reject_degree(self):
+        """Test that a sharing of too high degree is rejected."""
+        for field in self.fields:
+            sharings = self.sharings(field, 2)
+            sharings[5] = shamir.share(field(5), 3, 7)
+            self.assertFalse(shamir.verify_sharings(sharings, 2))
+
+    def test_order(self):
+        """Test that the sharings may list the players in any order."""
+        sharings = self.sharings(self.fields[0], 2)
+        sharings[3].reverse()
+        self.assertTrue(shamir.verify_sharings(sharings, 2))
+
+
+class ShareManyTest(TestCase):
+    """Tests for viff.shamir.share_many."""
+
+    def setUp(self):
+        self.fields = [GF(1031), GF(find_prime(2**64)), GF256]
+
+    def assert_same_as_share(self, secrets, threshold, num_players):
+        """Check that share_many agrees with share element by element.
+
+        The random generator is reset between the two calls, so both
+        functions must draw the same coefficients.
+        """
+        try:
+            state = rand.getstate()
+        except NotImplementedError:
+            raise SkipTest("The random generator cannot be reset.")
+        many = shamir.share_many(secrets, threshold, num_players)
+        rand.setstate(state)
+        single = [shamir.share(s, threshold, num_players) for s in secrets]
+
+        self.assertEquals(len(many), num_players)
+        for i, (player_id, shares) in enumerate(many):
+            self.assertEquals(player_id, single[0][i][0])
+            self.assertEquals(len(shares), len(secrets))
+            for k, share in enumerate(shares):
+                self.assertEquals(share, single[k][i][1])
+
+    def test_same_as_share(self):
+        """Test share_many against share for prime and binary fields."""
+        for field in self.fields:
+            secrets = [field(v) for v in [0, 1, 42, 117, 200]]
+            for threshold, num_players in [(0, 1), (1, 3), (2, 7)]:
+                self.assert_same_as_share(secrets, threshold, num_players)
+
+    def test_same_as_share_packed(self):
+        """Test share_many against share for a packed field."""
+        field = PackedGF2(16)
+        self.assert_same_as_share([field(0x1234), field(0xabcd)], 1, 4)
+
+    def test_recombine(self):
+        """Test that every secret can be recombined."""
+        for field in self.fields:
+            secrets = [field(v) for v in range(10)]
+            shares = shamir.share_many(secrets, 2, 5)
+            for k, secret in enumerate(secrets):
+                sharing = [(x, s[k]) for x, s in shares]
+                self.assertEquals(shamir.recombine(sharing[2:]), secret)
+                self.assertTrue(shamir.verify_sharing(sharing, 2))
+
+    def test_single(self):
+        """Test sharing a single secret."""
+        for field in self.fields:
+            self.assert_same_as_share([field(7)], 1, 3)
+
+    def test_empty(self):
+        """Test that no secrets give empty lists for every player."""
+        for field in self.fields:
+            shares = shamir.share_many([], 1, 3, field)
+            self.assertEquals(shares, [(field(1), []), (field(2), []),
+                                       (field(3), [])])
+
+
+class RecombinationCacheTest(TestCase):
+    """Tests for viff.shamir.RecombinationCache."""
+
+    def _test_lru(self):
+        cache = shamir.RecombinationCache(3)
+        for key in "abc":
+            cache.put(key, key.upper())
+        self.assertEquals(cache.get("a"), "A")
+        cache.put("d", "D")
+        # The least recently used vector is evicted.
+        self.assertEquals(cache.get("b"), None)
+        self.assertEquals(cache.get("a"), "A")
+        self.assertEquals(cache.get("c"), "C")
+        self.assertEquals(cache.get("d"), "D")
+        self.assertEquals(len(cache), 3)
+        self.assertEquals((cache.hits, cache.misses), (4, 1))
+
+    def test_lru(self):
+        self._test_lru()
+
+    def test_lru_without_ordered_dict(self):
+        """Test the cache as used on Python versions before 2.7."""
+        self.patch(shamir, "OrderedDict", _OrderedDict)
+        self._test_lru()
@@ -18,8 +18,10 @@
 """Tests for viff.util."""
 
 import os
+import itertools
+import collections
 
-from viff.util import deep_wait
+from viff.util import deep_wait, find_prime, rand, _OrderedDict, _combinations
 from viff.field import GF, GF256
 from viff import shamir, prss
 
@@ -213,3 +215,64 @@ class DeepWaitTest(TestCase):
 
         d.callback("d")
         self.assertIn("w", self.calls)
+
+
+class FindPrimeTest(TestCase):
+    """Tests for viff.util.find_prime."""
+
+    def test_order(self):
+        """Test that the order divides p - 1."""
+        for order in [1, 2, 3, 16, 2**10, 2**10 * 3]:
+            prime = find_prime(2**40, order=order)
+            self.assertEquals((prime - 1) % order, 0)
+            self.assertTrue(prime >= 2**40)
+
+    def test_blum_order(self):
+        """Test Blum primes with an order not divisible by 4."""
+        for order in [1, 2, 3, 6, 10, 2 * 3**5]:
+            prime = find_prime(2**40, blum=True, order=order)
+            self.assertEquals(prime % 4, 3)
+            self.assertEquals((prime - 1) % order, 0)
+
+    def test_blum_order_impossible(self):
+        """Test that impossible Blum orders are rejected."""
+        for order in [4, 8, 12, 2**10]:
+            self.assertRaises(ValueError, find_prime, 2**40,
+                              blum=True, order=order)
+
+
+class CompatibilityTest(TestCase):
+    """Tests for the replacements used on older Python versions."""
+
+    def test_ordered_dict(self):
+        """Compare _OrderedDict with collections.OrderedDict."""
+        ours = _OrderedDict()
+        theirs = collections.OrderedDict()
+        for _ in range(500):
+            key = rand.randint(0, 20)
+            op = rand.randint(0, 4)
+            if op <= 1:
+                ours[key] = theirs[key] = rand.random()
+            elif op == 2:
+                self.assertEquals(ours.pop(key, None),
+                                  theirs.pop(key, None))
+            elif op == 3 and theirs:
+                last = bool(rand.randint(0, 1))
+                self.assertEquals(ours.popitem(last=last),
+                                  theirs.popitem(last=last))
+            elif op == 4 and key in theirs:
+                del ours[key], theirs[key]
+            self.assertEquals(list(ours), list(theirs))
+            self.assertEquals(ours.keys(), theirs.keys())
+            self.assertEquals(len(ours), len(theirs))
+        ours.clear()
+        self.assertEquals(list(ours), [])
+        self.assertRaises(KeyError, ours.popitem)
+
+    def test_combinations(self):
+        """Compare _combinations with itertools.combinations."""
+        for n in range(6):
+            for size in range(n + 2):
+                self.assertEquals(list(_combinations(range(n), size)),
+                                  list(itertools.combinations(range(n),
+                                                              size)))
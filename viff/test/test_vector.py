@@ -0,0 +1,153 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.vector."""
+
+import operator
+
+from twisted.trial.unittest import TestCase
+
+from viff.field import GF, GF256, PackedGF2
+from viff.matrix import Matrix, hyper
+from viff.util import find_prime, rand
+from viff import shamir
+from viff.vector import FieldVector, GF256Vector, gf256_mat_mul, numpy
+
+#: Declare doctests for Trial.
+if numpy:
+    __doctests__ = ['viff.vector']
+
+
+class FieldVectorTest(TestCase):
+    """Tests comparing vectors with lists of field elements."""
+
+    def setUp(self):
+        self.field = GF(find_prime(2**30))
+        modulus = self.field.modulus
+        self.a = [self.field(rand.randint(0, modulus - 1))
+                  for _ in range(100)]
+        self.b = [self.field(rand.randint(0, modulus - 1))
+                  for _ in range(100)]
+
+    def test_conversion(self):
+        """Test conversion to and from lists."""
+        self.assertEquals(FieldVector(self.field, self.a).tolist(), self.a)
+
+    def test_elementwise(self):
+        """Test element-wise operations."""
+        x = FieldVector(self.field, self.a)
+        y = FieldVector(self.field, self.b)
+        for op in [operator.add, operator.sub, operator.mul]:
+            self.assertEquals(op(x, y).tolist(), map(op, self.a, self.b))
+            c = self.b[0]
+            self.assertEquals(op(x, c).tolist(),
+                              [op(e, c) for e in self.a])
+            self.assertEquals(op(c, x).tolist(),
+                              [op(c, e) for e in self.a])
+        self.assertEquals((-x).tolist(), [-e for e in self.a])
+
+    def test_dot(self):
+        """Test inner product."""
+        x = FieldVector(self.field, self.a)
+        y = FieldVector(self.field, self.b)
+        self.assertEquals(x.dot(y), sum(map(operator.mul, self.a, self.b)))
+
+    def test_matrix(self):
+        """Test matrix-vector product."""
+        M = hyper(len(self.a), self.field)
+        x = FieldVector(self.field, self.a)
+        column = M * Matrix([[e] for e in self.a])
+        self.assertEquals((M * x).tolist(), [row[0] for row in column.rows])
+
+    def test_matrix_dimensions(self):
+        """Test matrix-vector product with wrong dimensions."""
+        x = FieldVector(self.field, self.a)
+        self.assertRaises(ValueError, operator.mul, Matrix(2, 3), x)
+
+    def test_shamir(self):
+        """Test sharing and recombining a vector."""
+        x = FieldVector(self.field, self.a)
+        shares = shamir.share(x, 2, 5)
+        self.assertEquals(len(shares), 5)
+        self.assertEquals(shamir.recombine(shares[1:4]), x)
+        for i, a in enumerate(self.a):
+            single = [(p, s[i]) for p, s in shares[2:]]
+            self.assertEquals(shamir.recombine(single), a)
+
+    def test_unsupported_field(self):
+        """Test that large fields and GF256 are rejected."""
+        self.assertRaises(ValueError, FieldVector, GF256, [1, 2])
+        self.assertRaises(ValueError, FieldVector, GF(find_prime(2**31)),
+                          [1, 2])
+
+    def test_packed_field(self):
+        """Test that packed binary fields are rejected.
+
+        Their modulus is below the limit for vectors, but they must
+        not get prime field arithmetic.
+        """
+        for width in 1, 2, 3:
+            field = PackedGF2(width)
+            self.assertTrue(field.modulus < 2**31)
+            self.assertRaises(ValueError, FieldVector, field,
+                              [field(1), field(2)])
+
+if not numpy:
+    FieldVectorTest.skip = "Skipped due to missing numpy module."
+
+
+class GF256VectorTest(TestCase):
+    """Tests comparing GF256 vectors with lists of GF256 elements."""
+
+    def setUp(self):
+        self.a = [GF256(rand.randint(0, 255)) for _ in range(200)]
+        self.b = [GF256(rand.randint(1, 255)) for _ in range(200)]
+
+    def test_conversion(self):
+        """Test conversion to and from lists."""
+        self.assertEquals(GF256Vector(self.a).tolist(), self.a)
+
+    def test_elementwise(self):
+        """Test element-wise operations."""
+        x = GF256Vector(self.a)
+        y = GF256Vector(self.b)
+        for op in [operator.add, operator.sub, operator.xor, operator.mul]:
+            self.assertEquals(op(x, y).tolist(), map(op, self.a, self.b))
+            c = self.b[0]
+            self.assertEquals(op(x, c).tolist(),
+                              [op(e, c) for e in self.a])
+            self.assertEquals(op(c, x).tolist(),
+                              [op(c, e) for e in self.a])
+
+    def test_invert(self):
+        """Test inversion."""
+        self.assertEquals((~GF256Vector(self.b)).tolist(),
+                          [~e for e in self.b])
+        self.assertRaises(ZeroDivisionError, operator.invert,
+                          GF256Vector([0, 1]))
+
+    def test_mat_mul(self):
+        """Test constant matrix multiplication."""
+        rows = [[GF256(rand.randint(0, 255)) for _ in range(4)]
+                for _ in range(3)]
+        columns = [self.a[i::4][:10] for i in range(4)]
+        result = gf256_mat_mul(rows, GF256Vector(columns))
+        expected = Matrix(rows) * Matrix(columns)
+        self.assertEquals(result.tolist(), expected.rows)
+
+if not numpy:
+    GF256VectorTest.skip = "Skipped due to missing numpy module."
@@ -56,6 +56,96 @@ else:
     rand = random.Random(_seed)
 
 
+class _OrderedDict(dict):
+    """A dictionary which remembers the order in which keys were
+    inserted. The keys are kept in a list next to the dictionary:
+
+    >>> d = _OrderedDict()
+    >>> d["b"] = 1
+    >>> d["a"] = 2
+    >>> d["c"] = 3
+    >>> d.popitem(last=False)
+    ('b', 1)
+    >>> d.pop("c")
+    3
+    >>> list(d)
+    ['a']
+
+    This is used on Python versions before 2.7, where
+    :class:`collections.OrderedDict` is missing. Only the methods used
+    in VIFF are supported.
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self._keys = []
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._keys.append(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._keys.remove(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._keys.remove(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self, last=True):
+        if not self._keys:
+            raise KeyError("dictionary is empty")
+        if last:
+            key = self._keys.pop()
+        else:
+            key = self._keys.pop(0)
+        return key, dict.pop(self, key)
+
+    def clear(self):
+        dict.clear(self)
+        del self._keys[:]
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6 and earlier.
+    OrderedDict = _OrderedDict
+
+
+def _combinations(iterable, size):
+    """Generate the tuples of *size* elements from *iterable*.
+
+    The tuples are generated recursively in the same order as
+    :func:`itertools.combinations`:
+
+    >>> list(_combinations("abc", 2))
+    [('a', 'b'), ('a', 'c'), ('b', 'c')]
+
+    This is used on Python versions before 2.6.
+    """
+    pool = tuple(iterable)
+    if size == 0:
+        yield ()
+        return
+    for i in range(len(pool) - size + 1):
+        for rest in _combinations(pool[i+1:], size - 1):
+            yield (pool[i],) + rest
+
+try:
+    from itertools import combinations
+except ImportError:
+    # Python 2.5 and earlier.
+    combinations = _combinations
+
+
 def wrapper(func):
     """Decorator used for wrapper functions.
 
@@ -226,7 +316,7 @@ class deep_wait(Deferred):
             # we are done!
             self.callback(None)
 
-def find_prime(lower_bound, blum=False):
+def find_prime(lower_bound, blum=False, order=None):
     """Find a prime above a lower bound.
 
     If a prime is given as the lower bound, then this prime is
@@ -253,8 +343,35 @@ def find_prime(lower_bound, blum=False):
 
     >>> find_prime(-100)
     2L
+
+    Primes p such that *order* divides p - 1 can be found too. The
+    field of integers modulo such a prime has roots of unity of the
+    given order, as needed by :mod:`viff.ntt`:
+
+    >>> find_prime(100, order=16)
+    113L
+
+    A Blum prime p with *order* dividing p - 1 only exists when
+    *order* is not divisible by 4, other orders are rejected:
+
+    >>> find_prime(100, blum=True, order=6)
+    103L
+    >>> find_prime(100, blum=True, order=8)
+    Traceback (most recent call last):
+        ...
+    ValueError: No Blum prime p has 8 dividing p - 1
     """
     lower_bound = eval(str(lower_bound), {}, {})
+    if order:
+        if blum and order % 4 == 0:
+            raise ValueError("No Blum prime p has %d dividing p - 1" % order)
+        # Only consider numbers of the form k * order + 1.
+        k = (max(lower_bound, 2) - 2) // order + 1
+        prime = mpz(k * order + 1)
+        while not prime.is_prime() or (blum and prime % 4 != 3):
+            prime += order
+        return long(prime)
+
     if lower_bound < 0:
         prime = mpz(2)
     else:
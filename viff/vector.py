@@ -0,0 +1,440 @@
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Vectors of field elements. The :class:`FieldVector` class stores
+many elements of a prime field as a NumPy array and does the
+arithmetic on all of them at once. This is much faster than working
+on one :func:`viff.field.GF` element at a time when the same operation
+is done on large batches of numbers.
+
+>>> from viff.field import GF
+>>> Zp = GF(1031)
+>>> x = FieldVector(Zp, [1, 2, 3])
+>>> y = FieldVector(Zp, [Zp(10), Zp(20), Zp(1030)])
+>>> print x + y
+[{11}, {22}, {2}]
+>>> print x * y
+[{10}, {40}, {1028}]
+>>> x.dot(y)
+{47}
+
+Vectors can be converted back to lists of field elements:
+
+>>> x.tolist()
+[{1}, {2}, {3}]
+
+The arrays hold 64-bit integers and so only prime fields with a
+modulus below :data:`MAX_MODULUS` are supported. Fields of
+characteristic 2 are rejected, elements of GF(2^8) are handled by
+:class:`GF256Vector` instead.
+
+NumPy is an optional dependency of VIFF and the module can only be
+used if it is installed.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from viff.field import GF256
+from viff.util import rand
+
+#: Upper bound for the modulus of fields used in vectors. Values are
+#: kept reduced, so the product of two values fits in a signed 64-bit
+#: integer.
+MAX_MODULUS = 2**31
+
+
+class FieldVector(object):
+    """A vector of elements from a prime field.
+
+    Vectors support element-wise addition, subtraction, and
+    multiplication with other vectors of the same length, and
+    addition and multiplication with single field elements or
+    integers. The result is always a new vector.
+    """
+
+    __slots__ = ['field', 'values']
+
+    def __init__(self, field, values):
+        """Create a vector of elements from *field*.
+
+        The *values* can be a list of field elements or integers, or a
+        NumPy array. The values are reduced modulo the field modulus.
+        """
+        if numpy is None:
+            raise ImportError("NumPy is needed for field vectors")
+        if field.modulus >= MAX_MODULUS or field.characteristic == 2:
+            raise ValueError("Vectors are not supported for modulus %d"
+                             % field.modulus)
+        modulus = field.modulus
+        if not isinstance(values, numpy.ndarray):
+            values = [int(v) % modulus for v in values]
+            values = numpy.array(values, dtype=numpy.int64)
+        else:
+            values = values.astype(numpy.int64) % modulus
+        self.field = field
+        self.values = values
+
+    def _new(self, values):
+        """Wrap *values*, which must already be reduced."""
+        result = object.__new__(FieldVector)
+        result.field = self.field
+        result.values = values
+        return result
+
+    @classmethod
+    def random(cls, field, length):
+        """Return a vector with *length* uniformly random elements.
+
+        The elements are drawn from :data:`viff.util.rand`.
+        """
+        modulus = field.modulus
+        return cls(field, [rand.randint(0, modulus - 1)
+                           for _ in xrange(length)])
+
+    def _operand(self, other):
+        """Return the array or reduced integer to use for *other*."""
+        if isinstance(other, FieldVector):
+            assert self.field is other.field, "Fields must be identical"
+            if len(other.values) != len(self.values):
+                raise ValueError("Vectors must have the same length")
+            return other.values
+        try:
+            assert self.field is other.field, "Fields must be identical"
+        except AttributeError:
+            # We have a Python integer.
+            pass
+        return int(other) % self.field.modulus
+
+    def __len__(self):
+        """Number of elements in the vector."""
+        return len(self.values)
+
+    def __getitem__(self, index):
+        """Return a single element or, for a slice, a new vector.
+
+        >>> from viff.field import GF
+        >>> x = FieldVector(GF(17), [1, 2, 3, 4])
+        >>> x[1]
+        {2}
+        >>> print x[1:3]
+        [{2}, {3}]
+        """
+        if isinstance(index, slice):
+            return self._new(self.values[index])
+        return self.field(int(self.values[index]))
+
+    def __iter__(self):
+        """Iterate over the elements of the vector."""
+        field = self.field
+        for value in self.values.tolist():
+            yield field(value)
+
+    def tolist(self):
+        """Convert the vector to a list of field elements."""
+        return list(self)
+
+    def __add__(self, other):
+        """Element-wise addition."""
+        if not isinstance(other, (FieldVector, int, long)) \
+                and not hasattr(other, "field"):
+            return NotImplemented
+        return self._new((self.values + self._operand(other))
+                         % self.field.modulus)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        """Element-wise subtraction."""
+        if not isinstance(other, (FieldVector, int, long)) \
+                and not hasattr(other, "field"):
+            return NotImplemented
+        return self._new((self.values - self._operand(other))
+                         % self.field.modulus)
+
+    def __rsub__(self, other):
+        """Element-wise subtraction from an element."""
+        return self._new((self._operand(other) - self.values)
+                         % self.field.modulus)
+
+    def __mul__(self, other):
+        """Element-wise multiplication.
+
+        >>> from viff.field import GF
+        >>> Zp = GF(17)
+        >>> print FieldVector(Zp, [1, 2, 3]) * Zp(6)
+        [{6}, {12}, {1}]
+        """
+        if not isinstance(other, (FieldVector, int, long)) \
+                and not hasattr(other, "field"):
+            return NotImplemented
+        return self._new((self.values * self._operand(other))
+                         % self.field.modulus)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        """Negation."""
+        return self._new(-self.values % self.field.modulus)
+
+    def dot(self, other):
+        """Inner product with another vector.
+
+        The products are reduced before they are summed, so the
+        result is exact for vectors of up to 2**32 elements.
+        """
+        products = (self.values * self._operand(other)) % self.field.modulus
+        return self.field(int(products.sum() % self.field.modulus))
+
+    def sum(self):
+        """Sum of the elements."""
+        return self.field(int(self.values.sum() % self.field.modulus))
+
+    def __eq__(self, other):
+        """Equality test.
+
+        >>> from viff.field import GF
+        >>> Zp = GF(17)
+        >>> FieldVector(Zp, [1, 2]) == FieldVector(Zp, [18, 19])
+        True
+        """
+        if not isinstance(other, FieldVector):
+            return False
+        return self.field is other.field \
+            and numpy.array_equal(self.values, other.values)
+
+    def __ne__(self, other):
+        """Inequality test."""
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        """Informal string representation."""
+        return str(self.tolist())
+
+    def __repr__(self):
+        """Unambiguous string representation.
+
+        >>> from viff.field import GF
+        >>> FieldVector(GF(17), [1, 2])
+        FieldVector(GF(17), [1, 2])
+        """
+        return "FieldVector(GF(%d), %s)" % (self.field.modulus,
+                                            self.values.tolist())
+
+
+def mat_vec(rows, vector):
+    """Multiply a matrix given by *rows* with *vector*.
+
+    The *rows* is a list of lists of field elements or integers. The
+    result is a new vector:
+
+    >>> from viff.field import GF
+    >>> Zp = GF(17)
+    >>> print mat_vec([[1, 2], [3, 4]], FieldVector(Zp, [5, 6]))
+    [{0}, {5}]
+    """
+    modulus = vector.field.modulus
+    matrix = FieldVector(vector.field, [v for row in rows for v in row])
+    matrix = matrix.values.reshape(len(rows), len(vector))
+    products = (matrix * vector.values) % modulus
+    return vector._new(products.sum(axis=1) % modulus)
+
+
+def _generate_gf256_tables():
+    """Generate logarithm and exponentiation tables for GF(2^8).
+
+    The generator is ``0x03``, just like for the tables in
+    :mod:`viff.field`. The exponentiation table is doubled so that
+    the sum of two logarithms can be looked up without reduction.
+    """
+    exp_table = numpy.zeros(510, dtype=numpy.uint8)
+    log_table = numpy.zeros(256, dtype=numpy.intp)
+    a = GF256(1)
+    for c in range(255):
+        exp_table[c] = exp_table[c + 255] = a.value
+        log_table[a.value] = c
+        a *= GF256(3)
+    return exp_table, log_table
+
+if numpy:
+    _gf256_exp, _gf256_log = _generate_gf256_tables()
+
+
+def _gf256_mul(a, b):
+    """Multiply two arrays of bytes element-wise."""
+    product = _gf256_exp[_gf256_log[a] + _gf256_log[b]]
+    return numpy.where((a == 0) | (b == 0), 0, product).astype(numpy.uint8)
+
+
+class GF256Vector(object):
+    """An array of GF(2^8) elements.
+
+    The array can have any shape, so it can hold a single AES state
+    of 4 rows or a batch of states. Addition (which is the same as
+    xor), multiplication and inversion are done element-wise:
+
+    >>> x = GF256Vector([1, 2, 0x53])
+    >>> print x + GF256Vector([3, 3, 3])
+    [[2], [1], [80]]
+    >>> print x * GF256(0xca)
+    [[202], [143], [1]]
+    >>> print ~x
+    [[1], [141], [202]]
+    """
+
+    __slots__ = ['values']
+
+    field = GF256
+
+    def __init__(self, values):
+        """Create a new vector.
+
+        The *values* can be a (nested) list of :class:`GF256`
+        elements or integers, or a NumPy array.
+        """
+        if numpy is None:
+            raise ImportError("NumPy is needed for field vectors")
+        self.values = numpy.array(values, dtype=numpy.int64) \
+            .astype(numpy.uint8)
+
+    def _new(self, values):
+        """Wrap *values*, which must be an array of bytes."""
+        result = object.__new__(GF256Vector)
+        result.values = values
+        return result
+
+    @staticmethod
+    def _operand(other):
+        """Return the array or byte to use for *other*."""
+        if isinstance(other, GF256Vector):
+            return other.values
+        return numpy.uint8(int(other))
+
+    def __len__(self):
+        """Length of the first axis."""
+        return len(self.values)
+
+    @property
+    def shape(self):
+        """Shape of the underlying array."""
+        return self.values.shape
+
+    def __getitem__(self, index):
+        """Return a single element or a new vector.
+
+        >>> x = GF256Vector([[1, 2], [3, 4]])
+        >>> x[1, 0]
+        [3]
+        >>> print x[:, 1]
+        [[2], [4]]
+        """
+        values = self.values[index]
+        if isinstance(values, numpy.ndarray):
+            return self._new(values)
+        return GF256(int(values))
+
+    def tolist(self):
+        """Convert to (nested) lists of :class:`GF256` elements."""
+        def convert(value):
+            if isinstance(value, list):
+                return map(convert, value)
+            return GF256(value)
+        return convert(self.values.tolist())
+
+    def __add__(self, other):
+        """Element-wise addition, which is the same as xor."""
+        if not isinstance(other, (GF256Vector, GF256, int, long)):
+            return NotImplemented
+        return self._new(self.values ^ self._operand(other))
+
+    __radd__ = __sub__ = __rsub__ = __xor__ = __rxor__ = __add__
+
+    def __mul__(self, other):
+        """Element-wise multiplication."""
+        if not isinstance(other, (GF256Vector, GF256, int, long)):
+            return NotImplemented
+        return self._new(_gf256_mul(self.values, self._operand(other)))
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        """Negation, which is the identity in GF(2^8)."""
+        return self._new(self.values.copy())
+
+    def __invert__(self):
+        """Element-wise inversion.
+
+        All elements must be non-zero:
+
+        >>> ~GF256Vector([1, 0])
+        Traceback (most recent call last):
+            ...
+        ZeroDivisionError: Cannot invert zero
+        """
+        if not self.values.all():
+            raise ZeroDivisionError("Cannot invert zero")
+        return self._new(_gf256_exp[255 - _gf256_log[self.values]])
+
+    def __eq__(self, other):
+        """Equality test."""
+        if not isinstance(other, GF256Vector):
+            return False
+        return numpy.array_equal(self.values, other.values)
+
+    def __ne__(self, other):
+        """Inequality test."""
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        """Informal string representation."""
+        return str(self.tolist())
+
+    def __repr__(self):
+        """Unambiguous string representation.
+
+        >>> GF256Vector([1, 2])
+        GF256Vector([1, 2])
+        """
+        return "GF256Vector(%s)" % self.values.tolist()
+
+
+def gf256_mat_mul(rows, vector):
+    """Multiply a constant matrix given by *rows* with *vector*.
+
+    The matrix is applied along the first axis of the vector, so the
+    columns of an AES state (or of a batch of states) are transformed
+    at once:
+
+    >>> print gf256_mat_mul([[2, 3], [1, 1]], GF256Vector([[1, 2], [3, 4]]))
+    [[[7], [8]], [[2], [6]]]
+    """
+    matrix = numpy.array(rows, dtype=numpy.int64).astype(numpy.uint8)
+    # Align the matrix columns with the first axis of the vector.
+    matrix = matrix.reshape(matrix.shape + (1,) * (vector.values.ndim - 1))
+    products = _gf256_mul(matrix, vector.values[numpy.newaxis])
+    return vector._new(numpy.bitwise_xor.reduce(products, axis=1))
+
+
+if __name__ == "__main__":
+    import doctest    #pragma NO COVER
+    doctest.testmod() #pragma NO COVER